@@ -1,5 +1,6 @@
 const { app, BrowserWindow, ipcMain } = require('electron')
 const path = require('path')
+const fs = require('fs')
 const serve = require('electron-serve')
 const { spawn } = require('child_process')
 const readline = require('readline')
@@ -7,15 +8,86 @@ const readline = require('readline')
 let mainWindow
 let pythonProcess
 let pythonReadline
+// Resolves once the server can answer project and settings commands
+let pythonStarted = null
+let resolvePythonStarted = null
+
+// Requests waiting for a response, keyed by the id sent along with the command
+const pendingRequests = new Map()
+let nextRequestId = 0
+// Events of each request are forwarded one after another, keyed by request id;
+// its response settles only once they have all reached the renderer
+const eventChains = new Map()
+
+function handlePythonLine(line) {
+  try {
+    console.log('Raw Python response:', line) // Debug logging
+
+    if (!line || line.trim() === '') {
+      console.warn('Received empty response from Python')
+      return // Don't process empty lines
+    }
+
+    const response = JSON.parse(line)
+    if (!response) {
+      console.warn('Received null response from Python')
+      return
+    }
+
+    if (response.event) {
+      // Streamed messages (audio chunks) are not the final response
+      if (response.event === 'ready' && response.data?.tier === 'control') {
+        resolvePythonStarted?.()
+      }
+      if (response.requestId == null) {
+        forwardEvent(response)
+      } else {
+        // Reading a chunk's audio file is async, so later chunks must wait their turn
+        const chain = eventChains.get(response.requestId) || Promise.resolve()
+        eventChains.set(response.requestId, chain.then(() => forwardEvent(response)))
+      }
+      return
+    }
+
+    const pending = pendingRequests.get(response.id)
+    if (!pending) {
+      console.warn('Received response for unknown request:', response.id)
+      return
+    }
+    pendingRequests.delete(response.id)
+    if (pending.timeout) clearTimeout(pending.timeout)
+
+    const drained = eventChains.get(response.id) || Promise.resolve()
+    eventChains.delete(response.id)
+    drained.then(() => {
+      if (response.success === undefined) {
+        pending.reject(new Error('Invalid response format: missing success field'))
+      } else if (response.success) {
+        pending.resolve(response.data)
+      } else {
+        pending.reject(new Error(response.error || 'Unknown error occurred'))
+      }
+    })
+  } catch (error) {
+    console.error('Error processing Python response:', error, 'Raw response:', line)
+  }
+}
+
+function rejectPendingRequests(error) {
+  for (const pending of pendingRequests.values()) {
+    if (pending.timeout) clearTimeout(pending.timeout)
+    pending.reject(error)
+  }
+  pendingRequests.clear()
+  eventChains.clear()
+}
 
-async function sendToPython(command) {
+async function sendToPython(command, id = `req-${nextRequestId++}`) {
   // Ensure Python process is running
   if (!pythonProcess || !pythonReadline) {
     console.log('Python process not running, attempting to restart...')
     try {
-      startPythonProcess()
-      // Wait for process to initialize
-      await new Promise(resolve => setTimeout(resolve, 1000))
+      await startPythonProcess()
     } catch (error) {
       throw new Error('Failed to start Python process: ' + error.message)
     }
@@ -24,72 +96,34 @@ async function sendToPython(command) {
   return new Promise((resolve, reject) => {
     // Only set timeout for non-generation commands
     let timeout = null
-    if (command.type !== 'generate-audio') {
+    if (!['generate-audio', 'generate-long-audio', 'generate_variants', 'register_prefix'].includes(command.type)) {
       timeout = setTimeout(() => {
-        pythonReadline?.removeListener('line', responseHandler)
+        pendingRequests.delete(id)
         reject(new Error('Timeout waiting for Python response'))
       }, 30000)
     }
 
-    const responseHandler = (line) => {
-      try {
-        console.log('Raw Python response:', line) // Debug logging
-        
-        if (!line || line.trim() === '') {
-          console.warn('Received empty response from Python')
-          return // Don't process empty lines
-        }
-
-        const response = JSON.parse(line)
-        if (timeout) clearTimeout(timeout)
-        pythonReadline?.removeListener('line', responseHandler)
-        
-        if (!response) {
-          reject(new Error('Received null response from Python'))
-          return
-        }
-
-        if (response.success === undefined) {
-          reject(new Error('Invalid response format: missing success field'))
-          return
-        }
-
-        if (response.success) {
-          resolve(response.data)
-        } else {
-          reject(new Error(response.error || 'Unknown error occurred'))
-        }
-      } catch (error) {
-        console.error('Error processing Python response:', error, 'Raw response:', line)
-        if (timeout) clearTimeout(timeout)
-        pythonReadline?.removeListener('line', responseHandler)
-        reject(error)
-      }
-    }
-
     if (!pythonReadline) {
       if (timeout) clearTimeout(timeout)
       reject(new Error('Python readline interface is not available'))
       return
     }
 
-    pythonReadline.on('line', responseHandler)
-    
     try {
-      const commandStr = JSON.stringify(command) + '\n'
+      const commandStr = JSON.stringify({ ...command, id }) + '\n'
       console.log('Sending to Python:', commandStr) // Debug logging
       
       if (!pythonProcess?.stdin?.writable) {
         if (timeout) clearTimeout(timeout)
-        pythonReadline.removeListener('line', responseHandler)
         reject(new Error('Python process stdin is not writable'))
         return
       }
 
+      pendingRequests.set(id, { resolve, reject, timeout })
       pythonProcess.stdin.write(commandStr)
     } catch (error) {
       if (timeout) clearTimeout(timeout)
-      pythonReadline?.removeListener('line', responseHandler)
+      pendingRequests.delete(id)
       reject(error)
     }
   })
@@ -97,7 +131,7 @@ async function sendToPython(command) {
 
 // Modify startPythonProcess to return a promise
 function startPythonProcess() {
-  return new Promise((resolve, reject) => {
+  pythonStarted = new Promise((resolve, reject) => {
     try {
       // Adjust path as needed
       const scriptPath = path.join(__dirname, '../../server/tts_server.py')
@@ -127,27 +161,26 @@ function startPythonProcess() {
         })
       })
 
-      // Wait for process to be ready
-      let initialized = false
+      // The server announces each tier of commands with a ready event; the
+      // control tier comes up before torch and Zonos have finished importing
       const initTimeout = setTimeout(() => {
-        if (!initialized) {
-          reject(new Error('Timeout waiting for Python process to initialize'))
-        }
+        reject(new Error('Timeout waiting for Python process to initialize'))
       }, 10000)
+      resolvePythonStarted = () => {
+        clearTimeout(initTimeout)
+        resolvePythonStarted = null
+        resolve()
+      }
 
       pythonReadline = readline.createInterface({
         input: pythonProcess.stdout,
         terminal: false
       })
+      pythonReadline.on('line', handlePythonLine)
 
       // Log stdout for debugging
       pythonProcess.stdout.on('data', (data) => {
         console.log('Python stdout:', data.toString())
-        if (!initialized && data.toString().includes('Server ready')) {
-          initialized = true
-          clearTimeout(initTimeout)
-          resolve()
-        }
       })
 
       // Log stderr for debugging
@@ -165,6 +198,7 @@ function startPythonProcess() {
         }
         pythonProcess = null
         pythonReadline = null
+        rejectPendingRequests(new Error('Python process exited'))
       })
 
     } catch (error) {
@@ -172,6 +206,58 @@ function startPythonProcess() {
       reject(error)
     }
   })
+  return pythonStarted
+}
+
+// Closing stdin lets the server finish queued commands and write pending autosaves;
+// it is only killed if it hasn't exited by the timeout
+function stopPythonProcess(timeoutMs = 5000) {
+  const child = pythonProcess
+  if (!child) return Promise.resolve()
+  return new Promise((resolve) => {
+    const timer = setTimeout(() => {
+      child.kill()
+      resolve()
+    }, timeoutMs)
+    child.once('exit', () => {
+      clearTimeout(timer)
+      resolve()
+    })
+    child.stdin.end()
+  })
+}
+
+// Audio comes back as raw samples in a temp file, only the metadata goes through JSON
+async function readAudioFile(meta) {
+  const bytes = await fs.promises.readFile(meta.path)
+  fs.promises.unlink(meta.path).catch(() => {})
+  const buffer = bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.byteLength)
+  if (meta.dtype === 'int16') {
+    return Float32Array.from(new Int16Array(buffer), sample => sample / 32768)
+  }
+  return new Float32Array(buffer)
+}
+
+async function forwardEvent(message) {
+  try {
+    if (message.event === 'audio-chunk') {
+      mainWindow?.webContents.send('audio-chunk', {
+        requestId: message.requestId,
+        seq: message.seq,
+        segment: message.segment,
+        sampleRate: message.data.sampleRate,
+        buffer: await readAudioFile(message.data)
+      })
+    } else if (message.event === 'model-status') {
+      mainWindow?.webContents.send('model-status', message.data)
+    } else if (message.event === 'render-progress') {
+      mainWindow?.webContents.send('render-progress', message.data)
+    } else if (message.event === 'ready') {
+      mainWindow?.webContents.send('server-ready', message.data)
+    }
+  } catch (error) {
+    console.error('Error forwarding Python event:', error)
+  }
 }
 
 // IPC Handlers
@@ -196,7 +282,7 @@ ipcMain.handle('get-model-conditioners', async (event, modelChoice) => {
   }
 })
 
-ipcMain.handle('generate-audio', async (event, params) => {
+ipcMain.handle('generate-audio', async (event, { requestId, params }) => {
   try {
     if (!params) {
       throw new Error('No parameters provided for audio generation')
@@ -206,14 +292,14 @@ ipcMain.handle('generate-audio', async (event, params) => {
     
     const result = await sendToPython({
       type: 'generate-audio',
-      params
-    })
+      params: { ...params, transport: 'file', dtype: 'float32' }
+    }, requestId)
 
     if (!result) {
       throw new Error('No result received from Python process')
     }
 
-    return result
+    return { success: true, data: [result.sampleRate, await readAudioFile(result)], seed: result.seed }
   } catch (error) {
     console.error('Error generating audio:', error)
     // Send error to renderer process for better user feedback
@@ -225,6 +311,89 @@ ipcMain.handle('generate-audio', async (event, params) => {
   }
 })
 
+ipcMain.handle('generate-audio-stream', async (event, { requestId, params }) => {
+  try {
+    if (!params) {
+      throw new Error('No parameters provided for audio generation')
+    }
+
+    return await sendToPython({
+      type: 'generate-audio',
+      requestId,
+      params: { ...params, stream: true, transport: 'file', dtype: 'float32' }
+    }, requestId)
+  } catch (error) {
+    console.error('Error streaming audio:', error)
+    mainWindow?.webContents.send('python-error', {
+      type: 'generation-error',
+      error: error.message
+    })
+    throw error
+  }
+})
+
+ipcMain.handle('generate-variants', async (event, { requestId, params, count, variants }) => {
+  try {
+    if (!params) {
+      throw new Error('No parameters provided for audio generation')
+    }
+
+    const takes = await sendToPython({
+      type: 'generate_variants',
+      params: { ...params, transport: 'file', dtype: 'float32' },
+      count,
+      variants
+    }, requestId)
+
+    return await Promise.all(takes.map(async take => ({
+      seed: take.seed,
+      overrides: take.overrides,
+      error: take.error,
+      data: take.data ? [take.data.sampleRate, await readAudioFile(take.data)] : undefined
+    })))
+  } catch (error) {
+    console.error('Error generating variants:', error)
+    mainWindow?.webContents.send('python-error', {
+      type: 'generation-error',
+      error: error.message
+    })
+    throw error
+  }
+})
+
+ipcMain.handle('generate-long-audio', async (event, { requestId, params, outputPath }) => {
+  try {
+    if (!params) {
+      throw new Error('No parameters provided for audio generation')
+    }
+
+    return await sendToPython({
+      type: 'generate-long-audio',
+      requestId,
+      params: { ...params, output_path: outputPath, transport: 'file', dtype: 'float32' }
+    }, requestId)
+  } catch (error) {
+    console.error('Error generating long-form audio:', error)
+    mainWindow?.webContents.send('python-error', {
+      type: 'generation-error',
+      error: error.message
+    })
+    throw error
+  }
+})
+
+ipcMain.handle('cancel-generation', async (event, requestId) => {
+  try {
+    return await sendToPython({
+      type: 'cancel',
+      targetId: requestId
+    })
+  } catch (error) {
+    console.error('Error cancelling generation:', error)
+    throw error
+  }
+})
+
 ipcMain.handle('get-settings', async () => {
   try {
     return await sendToPython({ type: 'get_settings' })
@@ -246,9 +415,9 @@ ipcMain.handle('update-settings', async (event, settings) => {
   }
 })
 
-ipcMain.handle('get-projects', async () => {
+ipcMain.handle('get-projects', async (event, { offset, limit, search } = {}) => {
   try {
-    return await sendToPython({ type: 'get_projects' })
+    return await sendToPython({ type: 'get_projects', offset, limit, search })
   } catch (error) {
     console.error('Error getting projects:', error)
     throw error
@@ -279,9 +448,9 @@ ipcMain.handle('get-project', async (event, projectId) => {
   }
 })
 
-ipcMain.handle('get-history', async () => {
+ipcMain.handle('get-history', async (event, { offset, limit } = {}) => {
   try {
-    return await sendToPython({ type: 'get_history' })
+    return await sendToPython({ type: 'get_history', offset, limit })
   } catch (error) {
     console.error('Error getting history:', error)
     throw error
@@ -334,6 +503,78 @@ ipcMain.handle('undo-action', async (event, actionId) => {
   }
 })
 
+ipcMain.handle('get-model-status', async () => {
+  try {
+    return await sendToPython({ type: 'get_model_status' })
+  } catch (error) {
+    console.error('Error getting model status:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('get-capabilities', async () => {
+  try {
+    return await sendToPython({ type: 'get_capabilities' })
+  } catch (error) {
+    console.error('Error getting capabilities:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('get-metrics', async () => {
+  try {
+    return await sendToPython({ type: 'get_metrics' })
+  } catch (error) {
+    console.error('Error getting metrics:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('register-prefix', async (event, { name, path, model }) => {
+  try {
+    return await sendToPython({ type: 'register_prefix', name, path, model })
+  } catch (error) {
+    console.error('Error registering prefix:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('list-prefixes', async () => {
+  try {
+    return await sendToPython({ type: 'list_prefixes' })
+  } catch (error) {
+    console.error('Error listing prefixes:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('render-projects', async (event, projectIds) => {
+  try {
+    return await sendToPython({ type: 'render_projects', projectIds })
+  } catch (error) {
+    console.error('Error starting render:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('get-render-jobs', async (event, jobId) => {
+  try {
+    return await sendToPython({ type: 'get_render_jobs', jobId })
+  } catch (error) {
+    console.error('Error getting render jobs:', error)
+    throw error
+  }
+})
+
+ipcMain.handle('cancel-render', async (event, jobId) => {
+  try {
+    return await sendToPython({ type: 'cancel_render', jobId })
+  } catch (error) {
+    console.error('Error cancelling render:', error)
+    throw error
+  }
+})
+
 ipcMain.handle('get-voice-settings', async (event, voice) => {
   try {
     return await sendToPython({
@@ -388,10 +629,8 @@ const createWindow = () => {
 
 app.on("ready", createWindow);
 
-app.on("window-all-closed", () => {
-  if (pythonProcess) {
-    pythonProcess.kill()
-  }
+app.on("window-all-closed", async () => {
+  await stopPythonProcess()
   if (process.platform !== "darwin") {
     app.quit();
   }
@@ -10,6 +10,10 @@ contextBridge.exposeInMainWorld(
         "get-supported-models",
         "get-model-conditioners",
         "generate-audio",
+        "generate-audio-stream",
+        "generate-variants",
+        "generate-long-audio",
+        "cancel-generation",
         "get-settings",
         "update-settings",
         "get-projects",
@@ -20,7 +24,15 @@ contextBridge.exposeInMainWorld(
         "create-from-template",
         "clear-history",
         "undo-action",
-        "get-voice-settings"
+        "get-voice-settings",
+        "get-model-status",
+        "get-metrics",
+        "get-capabilities",
+        "render-projects",
+        "get-render-jobs",
+        "cancel-render",
+        "register-prefix",
+        "list-prefixes"
       ];
       if (validChannels.includes(channel)) {
         return ipcRenderer.invoke(channel, ...args);
@@ -34,10 +46,12 @@ contextBridge.exposeInMainWorld(
       }
     },
     on: (channel, func) => {
-      const validChannels = ["fromMain"];
+      const validChannels = ["fromMain", "audio-chunk", "model-status", "render-progress", "server-ready"];
       if (validChannels.includes(channel)) {
         // Strip event as it includes `sender` 
-        ipcRenderer.on(channel, (event, ...args) => func(...args));
+        const listener = (event, ...args) => func(...args);
+        ipcRenderer.on(channel, listener);
+        return () => ipcRenderer.removeListener(channel, listener);
       }
     }
   }
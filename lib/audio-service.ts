@@ -6,6 +6,7 @@ export interface GenerateAudioParams {
   language: string
   speaker_audio?: string | null
   prefix_audio?: string | null
+  prefix_id?: string | null
   emotion: {
     e1: number  // Happiness
     e2: number  // Sadness
@@ -54,12 +55,23 @@ export interface ProjectSettings {
   modified: number
 }
 
+export interface ProjectSummary {
+  name: string
+  created: number
+  modified: number
+  voice: string
+  size: number
+}
+
 export interface AppSettings {
   theme: string
   defaultVoice: string
   defaultOutputFormat: string
   projectsDirectory: string
   autoSave: boolean
+  defaultModel?: string
+  cacheResults?: boolean
+  historyRetention?: number
 }
 
 export interface HistoryEntry {
@@ -89,6 +101,129 @@ export interface VoiceSettings {
   }
 }
 
+function toServerParams(params: GenerateAudioParams) {
+  return {
+    model_choice: params.modelChoice,
+    text: params.text,
+    language: params.language,
+    speaker_audio: params.speaker_audio,
+    prefix_audio: params.prefix_audio,
+    prefix_id: params.prefix_id,
+    e1: params.emotion.e1,
+    e2: params.emotion.e2,
+    e3: params.emotion.e3,
+    e4: params.emotion.e4,
+    e5: params.emotion.e5,
+    e6: params.emotion.e6,
+    e7: params.emotion.e7,
+    e8: params.emotion.e8,
+    vq_single: params.vq_single,
+    fmax: params.fmax,
+    pitch_std: params.pitch_std,
+    speaking_rate: params.speaking_rate,
+    dnsmos_ovrl: params.dnsmos_ovrl,
+    speaker_noised: params.speaker_noised,
+    cfg_scale: params.cfg_scale,
+    top_p: params.sampling.top_p,
+    top_k: params.sampling.top_k,
+    min_p: params.sampling.min_p,
+    linear: params.sampling.linear,
+    confidence: params.sampling.confidence,
+    quadratic: params.sampling.quadratic,
+    seed: params.seed,
+    randomize_seed: params.randomize_seed,
+    unconditional_keys: params.unconditional_keys
+  }
+}
+
+export interface ModelStatus {
+  device: string
+  models: Record<string, 'loaded' | 'loading' | 'error'>
+  errors: Record<string, string>
+  residentBytes: number
+  budgetBytes: number | null
+}
+
+export interface RenderJob {
+  id: string
+  status: 'queued' | 'running' | 'done' | 'failed' | 'cancelled'
+  created: number
+  started: number | null
+  finished: number | null
+  items: {
+    projectId: string
+    status: 'pending' | 'done' | 'failed'
+    output: string | null
+    error: string | null
+  }[]
+}
+
+export interface RenderProgress {
+  jobId: string
+  status: RenderJob['status']
+  projectId: string | null
+  completed: number
+  total: number
+  progress: number
+  elapsed: number
+  eta: number | null
+}
+
+export interface PrefixHandle {
+  name: string
+  path: string
+  digest: string
+}
+
+export type ServerTier = 'control' | 'inference'
+
+export interface ServerReady {
+  tier: ServerTier
+  seconds: number
+  capabilities?: string[]
+  device?: string
+  models?: string[]
+  error?: string
+}
+
+export type ServerCapabilities = Record<ServerTier, 'idle' | 'loading' | 'ready' | 'error'>
+
+export function newRequestId(): string {
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`
+}
+
+export type VariantOverrides = Partial<Pick<GenerateAudioParams, 'seed' | 'cfg_scale'> & GenerateAudioParams['sampling']>
+
+export interface AudioVariant {
+  seed: number
+  overrides: VariantOverrides
+  buffer?: Float32Array
+  sampleRate?: number
+  error?: string
+}
+
+export interface AudioChunk {
+  requestId: string
+  seq: number
+  segment?: { index: number; text: string }
+  sampleRate: number
+  buffer: Float32Array
+}
+
+// Passes chunks on in seq order, holding back any that arrive ahead of their turn
+function inSeqOrder(onChunk: (chunk: AudioChunk) => void) {
+  const early = new Map<number, AudioChunk>()
+  let next = 0
+  return (chunk: AudioChunk) => {
+    early.set(chunk.seq, chunk)
+    while (early.has(next)) {
+      onChunk(early.get(next)!)
+      early.delete(next)
+      next += 1
+    }
+  }
+}
+
 export const audioService = {
   async getSupportedModels(): Promise<string[]> {
     const response = await window.electron.invoke('get-supported-models')
@@ -100,37 +235,13 @@ export const audioService = {
     return response
   },
 
-  async generateAudio(params: GenerateAudioParams): Promise<{ buffer: Float32Array; sampleRate: number }> {
+  async generateAudio(
+    params: GenerateAudioParams,
+    requestId: string = newRequestId()
+  ): Promise<{ buffer: Float32Array; sampleRate: number; seed: number }> {
     const response = await window.electron.invoke('generate-audio', {
-      model_choice: params.modelChoice,
-      text: params.text,
-      language: params.language,
-      speaker_audio: params.speaker_audio,
-      prefix_audio: params.prefix_audio,
-      e1: params.emotion.e1,
-      e2: params.emotion.e2,
-      e3: params.emotion.e3,
-      e4: params.emotion.e4,
-      e5: params.emotion.e5,
-      e6: params.emotion.e6,
-      e7: params.emotion.e7,
-      e8: params.emotion.e8,
-      vq_single: params.vq_single,
-      fmax: params.fmax,
-      pitch_std: params.pitch_std,
-      speaking_rate: params.speaking_rate,
-      dnsmos_ovrl: params.dnsmos_ovrl,
-      speaker_noised: params.speaker_noised,
-      cfg_scale: params.cfg_scale,
-      top_p: params.sampling.top_p,
-      top_k: params.sampling.top_k,
-      min_p: params.sampling.min_p,
-      linear: params.sampling.linear,
-      confidence: params.sampling.confidence,
-      quadratic: params.sampling.quadratic,
-      seed: params.seed,
-      randomize_seed: params.randomize_seed,
-      unconditional_keys: params.unconditional_keys
+      requestId,
+      params: toServerParams(params)
     })
     
     if (!response) {
@@ -160,10 +271,84 @@ export const audioService = {
 
     return {
       buffer,
-      sampleRate
+      sampleRate,
+      seed: response.seed
     }
   },
 
+  // Generates several takes of one line in a single batched pass; by default consecutive seeds
+  async generateVariants(
+    params: GenerateAudioParams,
+    options: { count?: number; variants?: VariantOverrides[] } = {},
+    requestId: string = newRequestId()
+  ): Promise<AudioVariant[]> {
+    const takes = await window.electron.invoke('generate-variants', {
+      requestId,
+      params: toServerParams(params),
+      count: options.count,
+      variants: options.variants
+    })
+    return takes.map((take: { seed: number; overrides: VariantOverrides; error?: string; data?: [number, Float32Array] }) => ({
+      seed: take.seed,
+      overrides: take.overrides,
+      error: take.error,
+      sampleRate: take.data?.[0],
+      buffer: take.data ? new Float32Array(take.data[1]) : undefined
+    }))
+  },
+
+  // Starts playback-ready chunks flowing to onChunk as soon as the first second is decoded
+  async streamAudio(
+    params: GenerateAudioParams,
+    onChunk: (chunk: AudioChunk) => void,
+    requestId: string = newRequestId()
+  ): Promise<{ sampleRate: number; frames: number; chunks: number; seed: number }> {
+    const deliver = inSeqOrder(onChunk)
+    const unsubscribe = window.electron.on('audio-chunk', (chunk: AudioChunk) => {
+      if (chunk.requestId === requestId) {
+        deliver(chunk)
+      }
+    })
+
+    try {
+      return await window.electron.invoke('generate-audio-stream', {
+        requestId,
+        params: toServerParams(params)
+      })
+    } finally {
+      unsubscribe?.()
+    }
+  },
+
+  // Synthesizes text of any length segment by segment, optionally writing a WAV file as it goes
+  async generateLongAudio(
+    params: GenerateAudioParams,
+    onChunk: (chunk: AudioChunk) => void,
+    outputPath?: string,
+    requestId: string = newRequestId()
+  ): Promise<{ sampleRate: number; frames: number; segments: number; outputPath?: string; seed: number }> {
+    const deliver = inSeqOrder(onChunk)
+    const unsubscribe = window.electron.on('audio-chunk', (chunk: AudioChunk) => {
+      if (chunk.requestId === requestId) {
+        deliver(chunk)
+      }
+    })
+
+    try {
+      return await window.electron.invoke('generate-long-audio', {
+        requestId,
+        params: toServerParams(params),
+        outputPath
+      })
+    } finally {
+      unsubscribe?.()
+    }
+  },
+
+  async cancelGeneration(requestId: string): Promise<boolean> {
+    return await window.electron.invoke('cancel-generation', requestId)
+  },
+
   async getSettings(): Promise<AppSettings> {
     const response = await window.electron.invoke('get-settings')
     return response
@@ -173,8 +358,8 @@ export const audioService = {
     await window.electron.invoke('update-settings', settings)
   },
 
-  async getProjects(): Promise<ProjectSettings[]> {
-    const response = await window.electron.invoke('get-projects')
+  async getProjects(options: { offset?: number; limit?: number; search?: string } = {}): Promise<ProjectSummary[]> {
+    const response = await window.electron.invoke('get-projects', options)
     return response
   },
 
@@ -187,8 +372,8 @@ export const audioService = {
     return response
   },
 
-  async getHistory(): Promise<HistoryEntry[]> {
-    const response = await window.electron.invoke('get-history')
+  async getHistory(offset = 0, limit?: number): Promise<HistoryEntry[]> {
+    const response = await window.electron.invoke('get-history', { offset, limit })
     return response
   },
 
@@ -210,5 +395,45 @@ export const audioService = {
 
   async getVoiceSettings(voice: string): Promise<VoiceSettings> {
     return await window.electron.invoke('get-voice-settings', voice)
+  },
+
+  async getModelStatus(): Promise<ModelStatus> {
+    return await window.electron.invoke('get-model-status')
+  },
+
+  async getCapabilities(): Promise<ServerCapabilities> {
+    return await window.electron.invoke('get-capabilities')
+  },
+
+  onServerReady(callback: (ready: ServerReady) => void): () => void {
+    return window.electron.on('server-ready', callback)
+  },
+
+  async getMetrics(): Promise<string> {
+    return await window.electron.invoke('get-metrics')
+  },
+
+  async registerPrefix(name: string, path: string, model?: string): Promise<PrefixHandle> {
+    return await window.electron.invoke('register-prefix', { name, path, model })
+  },
+
+  async listPrefixes(): Promise<PrefixHandle[]> {
+    return await window.electron.invoke('list-prefixes')
+  },
+
+  async renderProjects(projectIds: string[]): Promise<RenderJob> {
+    return await window.electron.invoke('render-projects', projectIds)
+  },
+
+  async getRenderJobs(): Promise<RenderJob[]> {
+    return await window.electron.invoke('get-render-jobs')
+  },
+
+  async cancelRender(jobId: string): Promise<boolean> {
+    return await window.electron.invoke('cancel-render', jobId)
+  },
+
+  onRenderProgress(callback: (progress: RenderProgress) => void): () => void {
+    return window.electron.on('render-progress', callback)
   }
 } 
\ No newline at end of file
@@ -1,12 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from collections import OrderedDict
+from concurrent.futures import Future
 from typing import List, Optional
-import torch
-import torchaudio
-import numpy as np
-from zonos.model import Zonos, DEFAULT_BACKBONE_CLS as ZonosBackbone
-from zonos.conditioning import make_cond_dict, supported_language_codes
+import os
+import time
+import uuid
+import asyncio
+import threading
+from zonos.model import DEFAULT_BACKBONE_CLS as ZonosBackbone
+from audio_transport import encode_frame
+from metrics import METRICS, REQUEST_SECONDS, Trace, activate
+from synthesis import GenerationCancelled, load_model_if_needed, resolve_seed, stream_audio, submit_audio
 
 app = FastAPI()
 
@@ -19,12 +27,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables
-CURRENT_MODEL_TYPE = None
-CURRENT_MODEL = None
-SPEAKER_EMBEDDING = None
-SPEAKER_AUDIO_PATH = None
-DEFAULT_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+class GenerationSlots:
+    """Admission control for HTTP generations.
+
+    At most ``limit`` requests may be queued or running on the inference
+    worker at once; past that, requests are turned away with a 429 instead of
+    piling up behind the Electron app's work.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.in_use >= self.limit:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Generation queue is full ({self.limit} pending)",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_use += 1
+
+    def release(self):
+        with self.lock:
+            self.in_use -= 1
+
+SLOTS = GenerationSlots(int(os.environ.get('VOICEPRO_HTTP_MAX_PENDING', 8)))
+METRICS.gauge("voicepro_http_pending", "HTTP generations queued or running.", lambda: [({}, SLOTS.in_use)])
+
+class GenerationJob:
+    def __init__(self, future: Future, cancel_event: threading.Event, trace: Trace, seed: int):
+        self.id = uuid.uuid4().hex
+        self.future = future
+        self.seed = seed
+        self.cancel_event = cancel_event
+        self.trace = trace
+        self.created = time.time()
+
+    def status(self) -> str:
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        error = self.future.exception()
+        if error is None:
+            return "completed"
+        return "cancelled" if isinstance(error, GenerationCancelled) else "failed"
+
+    def as_dict(self) -> dict:
+        status = self.status()
+        job = {"jobId": self.id, "status": status, "created": self.created, "seed": self.seed}
+        if status == "completed":
+            sample_rate, audio_data = self.future.result()
+            job.update(audio=audio_data.tolist(), sampleRate=sample_rate, timings=self.trace.as_dict())
+        elif status == "failed":
+            job["error"] = str(self.future.exception())
+        return job
+
+# Submitted jobs, oldest first; finished ones are dropped past the retention limit
+JOBS: "OrderedDict[str, GenerationJob]" = OrderedDict()
+JOBS_LOCK = threading.Lock()
+JOB_RETENTION = int(os.environ.get('VOICEPRO_HTTP_JOB_RETENTION', 64))
+
+def submit_generation(params: "GenerateParams") -> GenerationJob:
+    """Queue a generation on the inference worker under an admission slot."""
+    SLOTS.acquire()
+    cancel_event = threading.Event()
+    trace = Trace()
+    synthesis_params = resolve_seed(to_synthesis_params(params))
+    try:
+        with activate([trace]):
+            future = submit_audio(synthesis_params, cancel_event)
+    except Exception as e:
+        SLOTS.release()
+        raise HTTPException(status_code=400, detail=str(e))
+    future.add_done_callback(lambda _: SLOTS.release())
+    return GenerationJob(future, cancel_event, trace, synthesis_params["seed"])
+
+def remember_job(job: GenerationJob):
+    with JOBS_LOCK:
+        JOBS[job.id] = job
+        finished = [key for key, entry in JOBS.items() if entry.future.done()]
+        for key in finished[:max(0, len(JOBS) - JOB_RETENTION)]:
+            del JOBS[key]
+
+def find_job(job_id: str) -> GenerationJob:
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Streaming responses are timed to their headers, not the last frame
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - start,
+                            command=f"{request.method} {getattr(route, 'path', 'unmatched')}")
+    return response
 
 class GenerateParams(BaseModel):
     modelChoice: str
@@ -32,6 +134,7 @@ class GenerateParams(BaseModel):
     language: str
     speakerAudio: Optional[str]
     prefixAudio: Optional[str]
+    prefixId: Optional[str] = None
     emotion: List[float]
     vqSingle: float
     fmax: float
@@ -42,19 +145,38 @@ class GenerateParams(BaseModel):
     cfgScale: float
     samplingParams: dict
     unconditionalKeys: List[str]
+    seed: Optional[int] = None
+    randomizeSeed: bool = False
 
-def load_model_if_needed(model_choice: str):
-    global CURRENT_MODEL_TYPE, CURRENT_MODEL
-    if CURRENT_MODEL_TYPE != model_choice:
-        if CURRENT_MODEL is not None:
-            del CURRENT_MODEL
-            torch.cuda.empty_cache()
-        print(f"Loading {model_choice} model...")
-        CURRENT_MODEL = Zonos.from_pretrained(model_choice, device=DEFAULT_DEVICE)
-        CURRENT_MODEL.requires_grad_(False).eval()
-        CURRENT_MODEL_TYPE = model_choice
-        print(f"{model_choice} model loaded successfully!")
-    return CURRENT_MODEL
+def to_synthesis_params(params: GenerateParams) -> dict:
+    sampling = params.samplingParams
+    synthesis_params = {
+        "model_choice": params.modelChoice,
+        "text": params.text,
+        "language": params.language,
+        "speaker_audio": params.speakerAudio,
+        "prefix_audio": params.prefixAudio,
+        "prefix_id": params.prefixId,
+        "vq_single": params.vqSingle,
+        "fmax": params.fmax,
+        "pitch_std": params.pitchStd,
+        "speaking_rate": params.speakingRate,
+        "dnsmos_ovrl": params.dnsmosOverall,
+        "speaker_noised": params.speakerNoised,
+        "cfg_scale": params.cfgScale,
+        "top_p": sampling.get("top_p", 0.8),
+        "top_k": sampling.get("top_k", 50),
+        "min_p": sampling.get("min_p", 0.05),
+        "linear": sampling.get("linear", 0.5),
+        "confidence": sampling.get("confidence", sampling.get("conf", 0.4)),
+        "quadratic": sampling.get("quadratic", sampling.get("quad", 0.0)),
+        "unconditional_keys": params.unconditionalKeys,
+        "seed": params.seed,
+        "randomize_seed": params.randomizeSeed,
+    }
+    for i, value in enumerate(params.emotion[:8]):
+        synthesis_params[f"e{i + 1}"] = value
+    return synthesis_params
 
 @app.get("/models")
 async def get_supported_models():
@@ -66,7 +188,7 @@ async def get_supported_models():
     return supported_models
 
 @app.get("/conditioners")
-async def get_model_conditioners(model: str):
+def get_model_conditioners(model: str):
     try:
         model_instance = load_model_if_needed(model)
         conditioners = [c.name for c in model_instance.prefix_conditioner.conditioners]
@@ -75,32 +197,83 @@ async def get_model_conditioners(model: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate")
-async def generate_audio(params: GenerateParams):
+async def generate(params: GenerateParams):
+    # The event loop only awaits the inference worker's future, so other
+    # endpoints stay responsive and concurrent requests can be batched
+    job = submit_generation(params)
+    try:
+        sample_rate, audio_data = await asyncio.wrap_future(job.future)
+    except asyncio.CancelledError:
+        job.cancel_event.set()
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "audio": await run_in_threadpool(audio_data.tolist),
+        "sampleRate": sample_rate,
+        "seed": job.seed,
+        "timings": job.trace.as_dict(),
+    }
+
+@app.post("/jobs", status_code=202)
+def submit_job(params: GenerateParams):
+    """Queue a generation and return its id for polling."""
+    job = submit_generation(params)
+    remember_job(job)
+    return {"jobId": job.id, "status": job.status()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return find_job(job_id).as_dict()
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = find_job(job_id)
+    job.cancel_event.set()
+    return {"jobId": job.id, "status": job.status()}
+
+@app.post("/generate/stream")
+def generate_audio_stream(params: GenerateParams, chunkSeconds: float = 1.0):
+    """Stream length-prefixed float32 PCM frames while the clip is generated."""
+    request_id = uuid.uuid4().hex
+    synthesis_params = resolve_seed(to_synthesis_params(params))
+    SLOTS.acquire()
     try:
-        model = load_model_if_needed(params.modelChoice)
-        
-        # Handle speaker embedding
-        global SPEAKER_EMBEDDING, SPEAKER_AUDIO_PATH
-        if params.speakerAudio and 'speaker' not in params.unconditionalKeys:
-            if params.speakerAudio != SPEAKER_AUDIO_PATH:
-                print("Recomputing speaker embedding")
-                wav, sr = torchaudio.load(params.speakerAudio)
-                SPEAKER_EMBEDDING = model.make_speaker_embedding(wav, sr)
-                SPEAKER_EMBEDDING = SPEAKER_EMBEDDING.to(DEFAULT_DEVICE, torch.bfloat16)
-                SPEAKER_AUDIO_PATH = params.speakerAudio
-
-        # ... rest of generation code from gradio_interface.py ...
-        
-        # Return the audio data as base64
-        audio_data = wavOut.squeeze().cpu().numpy()
-        return {
-            "audio": audio_data.tolist(),
-            "sampleRate": model.autoencoder.sampling_rate
-        }
-        
+        chunks = stream_audio(synthesis_params, chunk_seconds=chunkSeconds)
+        # Pull the first chunk eagerly so setup errors still map to an HTTP error
+        sample_rate, first = next(chunks)
+    except StopIteration:
+        SLOTS.release()
+        raise HTTPException(status_code=500, detail="No audio was generated")
     except Exception as e:
+        SLOTS.release()
         raise HTTPException(status_code=500, detail=str(e))
 
+    def frames():
+        try:
+            yield encode_frame(first)
+            for _, chunk in chunks:
+                yield encode_frame(chunk)
+        finally:
+            chunks.close()
+            SLOTS.release()
+
+    return StreamingResponse(
+        frames(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Request-Id": request_id,
+            "X-Sample-Rate": str(sample_rate),
+            "X-Audio-Dtype": "float32",
+            "X-Seed": str(synthesis_params["seed"]),
+        },
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of latency, throughput, cache and memory metrics."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=7860) 
\ No newline at end of file
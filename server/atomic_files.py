@@ -0,0 +1,28 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+@contextmanager
+def atomic_write(path: Path, mode: str = 'w', **kwargs):
+    """Open a file that replaces ``path`` only once fully written and synced.
+
+    A crash leaves either the old file or the new one, never a partial
+    one. The temporary name is hidden, ends in ``.tmp`` and is unique per
+    thread, so directory scans skip it and concurrent writers don't collide.
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def write_json_atomic(path: Path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f)
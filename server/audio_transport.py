@@ -0,0 +1,63 @@
+import os
+import struct
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Supported ways of handing generated audio back to the caller
+TRANSPORTS = ('json', 'file', 'binary')
+DTYPES = ('float32', 'int16')
+
+# Binary frames are prefixed with the payload length as an unsigned 64-bit little-endian int
+FRAME_HEADER = struct.Struct('<Q')
+
+TEMP_AUDIO_DIR = Path(tempfile.gettempdir()) / 'voicepro'
+
+def encode_samples(audio: np.ndarray, dtype: str = 'float32') -> bytes:
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported audio dtype: {dtype}")
+    if dtype == 'int16':
+        pcm = np.clip(audio, -1.0, 1.0) * 32767.0
+        return pcm.astype('<i2').tobytes()
+    return np.ascontiguousarray(audio, dtype='<f4').tobytes()
+
+def encode_frame(audio: np.ndarray, dtype: str = 'float32') -> bytes:
+    payload = encode_samples(audio, dtype)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def write_temp_audio(payload: bytes, dtype: str) -> str:
+    TEMP_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = '.f32' if dtype == 'float32' else '.s16'
+    fd, path = tempfile.mkstemp(prefix='audio-', suffix=suffix, dir=TEMP_AUDIO_DIR)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(payload)
+    return path
+
+def pack_audio(audio: np.ndarray, sample_rate: int, transport: str = 'json',
+               dtype: str = 'float32') -> Tuple[object, Optional[bytes]]:
+    """Build the response data for an audio clip.
+
+    Returns the JSON-serializable data and, for the binary transport, the raw
+    frame that has to follow the JSON line on stdout.
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unsupported audio transport: {transport}")
+
+    if transport == 'json':
+        # Legacy format: [sample_rate, [samples...]]
+        return [int(sample_rate), audio.tolist()], None
+
+    payload = encode_samples(audio, dtype)
+    data = {
+        "sampleRate": int(sample_rate),
+        "frames": int(audio.shape[-1]),
+        "channels": 1,
+        "dtype": dtype,
+        "transport": transport,
+        "byteLength": len(payload),
+    }
+    if transport == 'file':
+        data["path"] = write_temp_audio(payload, dtype)
+        return data, None
+    return data, FRAME_HEADER.pack(len(payload)) + payload
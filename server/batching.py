@@ -0,0 +1,128 @@
+import sys
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable, List, Optional
+from metrics import STAGE_SECONDS, activate, active_traces
+
+class _Job:
+    def __init__(self, key: Optional[Hashable], payload, cancel_event: Optional[threading.Event],
+                 is_call: bool = False):
+        self.key = key
+        self.payload = payload
+        self.is_call = is_call
+        self.cancel_event = cancel_event
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        # Stage timings recorded on the inference thread go to the submitter's traces
+        self.traces = active_traces()
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+class InferenceScheduler:
+    """Single inference thread that merges compatible requests into batches.
+
+    ``submit`` queues a request under a batch key; requests that share a key
+    and arrive within ``window`` seconds of the oldest one are handed to
+    ``run_batch`` together (up to ``max_batch_size``), which returns one
+    result or exception per request. A key of None never batches. ``call``
+    queues arbitrary work, such as a streaming generation, to run alone on
+    the same thread so the model is never driven from two threads at once.
+
+    That covers everything that runs the backbone or the conditioners:
+    speaker embeddings, prefix encoding, conditioning and generation. Only
+    ``autoencoder.decode`` of already generated codes runs elsewhere, so
+    streaming and long-form decoding overlap with generation; the
+    autoencoder holds no state that generation touches.
+    """
+
+    def __init__(self, run_batch: Callable[[List, List], List], max_batch_size: int = 4,
+                 window: float = 0.02, on_cancel: Optional[Callable[[], Exception]] = None):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window
+        self.on_cancel = on_cancel or (lambda: RuntimeError("Cancelled"))
+        self.jobs: List[_Job] = []
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._loop, name='inference', daemon=True)
+        self.thread.start()
+
+    def submit(self, key: Optional[Hashable], params, cancel_event: Optional[threading.Event] = None) -> Future:
+        return self._enqueue(_Job(key, params, cancel_event))
+
+    def call(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._enqueue(_Job(None, lambda: fn(*args, **kwargs), None, is_call=True))
+
+    def pending(self) -> int:
+        with self.condition:
+            return len(self.jobs)
+
+    def _enqueue(self, job: _Job) -> Future:
+        with self.condition:
+            self.jobs.append(job)
+            self.condition.notify()
+        return job.future
+
+    def _matching(self, first: _Job) -> List[_Job]:
+        if first.key is None:
+            return [first]
+        return [job for job in self.jobs if job.key == first.key][:self.max_batch_size]
+
+    def _next_batch(self) -> List[_Job]:
+        with self.condition:
+            while not self.jobs:
+                self.condition.wait()
+            first = self.jobs[0]
+            # Give compatible requests a short window to join the oldest one
+            while first.key is not None:
+                remaining = first.enqueued_at + self.window - time.monotonic()
+                if remaining <= 0 or len(self._matching(first)) >= self.max_batch_size:
+                    break
+                self.condition.wait(remaining)
+            batch = self._matching(first)
+            for job in batch:
+                self.jobs.remove(job)
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = []
+            for job in self._next_batch():
+                if job.cancelled():
+                    job.future.set_exception(self.on_cancel())
+                elif job.future.set_running_or_notify_cancel():
+                    batch.append(job)
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            for job in batch:
+                STAGE_SECONDS.observe(started - job.enqueued_at, stage="queue_wait")
+                for trace in job.traces:
+                    trace.add("queue_wait", started - job.enqueued_at)
+            traces = [trace for job in batch for trace in job.traces]
+
+            if batch[0].is_call:
+                with activate(traces):
+                    self._run_call(batch[0])
+                continue
+
+            try:
+                with activate(traces):
+                    results = self.run_batch([job.payload for job in batch],
+                                             [job.cancel_event for job in batch])
+            except Exception as e:
+                print(f"Error running inference batch: {str(e)}", file=sys.stderr)
+                results = [e] * len(batch)
+            for job, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    job.future.set_exception(result)
+                else:
+                    job.future.set_result(result)
+
+    def _run_call(self, job: _Job):
+        try:
+            job.future.set_result(job.payload())
+        except Exception as e:
+            job.future.set_exception(e)
@@ -0,0 +1,531 @@
+"""Benchmark the TTS server hot paths on CPU with a tiny stand-in model.
+
+    python benchmark.py [--repeat 3] [--output results.json] [--skip-stdio]
+
+The stand-in is a randomly initialized model that follows the Zonos
+``generate`` contract (delay-patterned codes, EOS handling, callbacks), so
+every server code path runs without the real weights or a GPU. When the
+``zonos`` package itself is not importable, minimal ``zonos`` modules are
+injected so the server modules import. Results are written as JSON that can
+be diffed across commits; numbers only compare on the same machine.
+"""
+import os
+import sys
+import json
+import math
+import time
+import types
+import wave
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+import numpy as np
+import torch
+import torch.nn.functional as F
+from typing import Callable, Dict, List
+
+CORPUS = {
+    "short": "The quick brown fox jumps over the lazy dog.",
+    "medium": (
+        "Welcome back to the show. Today we are looking at how small changes in a "
+        "workflow add up over a year, and why the boring parts are usually the ones "
+        "worth automating first."
+    ),
+    "long": (
+        "It was late in the evening when the last train pulled out of the station. "
+        "The platform emptied quickly, leaving only the hum of the lights and the "
+        "distant sound of traffic. She checked the timetable again, although she "
+        "already knew what it said, and then walked slowly towards the exit. Outside, "
+        "the rain had stopped, and the streets shone under the lamps. There would be "
+        "another train in the morning, and for tonight the city would have to do."
+    ),
+}
+
+STANDIN_MODEL = "voicepro/tiny-standin"
+SAMPLE_RATE = 44100
+HOP_LENGTH = 512
+NUM_CODEBOOKS = 9
+CODEBOOK_SIZE = 1024
+EOS_TOKEN = 1024
+MASKED_TOKEN = 1025
+# Roughly how many code frames the stand-in speaks per conditioning token
+FRAMES_PER_TOKEN = 6
+
+class TinyConditioner(torch.nn.Module):
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+class TinyPrefixConditioner(torch.nn.Module):
+    SCALARS = {"speaker": 128, "emotion": 8, "fmax": 1, "pitch_std": 1, "speaking_rate": 1,
+               "vqscore_8": 8, "dnsmos_ovrl": 1, "speaker_noised": 1}
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.conditioners = torch.nn.ModuleList(
+            [TinyConditioner("espeak")] + [TinyConditioner(name) for name in self.SCALARS]
+        )
+        self.phoneme_embedder = torch.nn.Embedding(256, dim)
+        self.projections = torch.nn.ModuleDict({
+            name: torch.nn.Linear(size, dim) for name, size in self.SCALARS.items()
+        })
+        self.unconditional = torch.nn.Parameter(torch.randn(len(self.SCALARS), dim) * 0.02)
+
+    def forward(self, cond_dict: dict, keep: Callable[[str], bool]) -> torch.Tensor:
+        texts, languages = cond_dict["espeak"]
+        phonemize = getattr(sys.modules.get("zonos.conditioning"), "phonemize", None)
+        phonemes = phonemize(texts, languages) if phonemize else texts
+        ids = [list(str(p).encode("utf-8")) or [0] for p in phonemes]
+        length = max(len(i) for i in ids)
+        ids = torch.tensor([i + [0] * (length - len(i)) for i in ids])
+        parts = [self.phoneme_embedder(ids)]
+        batch = ids.shape[0]
+        for index, (name, size) in enumerate(self.SCALARS.items()):
+            value = cond_dict.get(name)
+            if value is None or not keep(name):
+                parts.append(self.unconditional[index].expand(batch, 1, -1))
+            else:
+                value = torch.as_tensor(value).float().reshape(batch, 1, -1)[..., :size]
+                parts.append(self.projections[name](F.pad(value, (0, size - value.shape[-1]))))
+        return torch.cat(parts, dim=1)
+
+class TinyAutoencoder(torch.nn.Module):
+    sampling_rate = SAMPLE_RATE
+
+    def __init__(self, dim: int = 32):
+        super().__init__()
+        self.codebooks = torch.nn.Parameter(torch.randn(NUM_CODEBOOKS, CODEBOOK_SIZE, dim) * 0.1)
+        self.encoder = torch.nn.Conv1d(1, dim, HOP_LENGTH, stride=HOP_LENGTH)
+        self.quantizer = torch.nn.Linear(dim, NUM_CODEBOOKS * CODEBOOK_SIZE)
+        self.decoder = torch.nn.ConvTranspose1d(dim, 1, HOP_LENGTH, stride=HOP_LENGTH)
+
+    def preprocess(self, wav: torch.Tensor, sr: int) -> torch.Tensor:
+        if sr != self.sampling_rate:
+            import torchaudio
+            wav = torchaudio.functional.resample(wav, sr, self.sampling_rate)
+        return F.pad(wav, (0, -wav.shape[-1] % HOP_LENGTH))
+
+    @torch.inference_mode()
+    def encode(self, wav: torch.Tensor) -> torch.Tensor:
+        hidden = self.encoder(wav.float()).transpose(1, 2)
+        logits = self.quantizer(hidden).view(wav.shape[0], -1, NUM_CODEBOOKS, CODEBOOK_SIZE)
+        return logits.argmax(-1).transpose(1, 2)
+
+    @torch.inference_mode()
+    def decode(self, codes: torch.Tensor) -> torch.Tensor:
+        embedded = sum(self.codebooks[k][codes[:, k]] for k in range(NUM_CODEBOOKS))
+        return torch.tanh(self.decoder(embedded.transpose(1, 2)))
+
+class TinyZonos(torch.nn.Module):
+    """Randomly initialized stand-in with the interface synthesis.py relies on."""
+
+    eos_token_id = EOS_TOKEN
+    masked_token_id = MASKED_TOKEN
+
+    def __init__(self, dim: int = 256, seed: int = 0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.autoencoder = TinyAutoencoder()
+        self.prefix_conditioner = TinyPrefixConditioner(dim)
+        self.speaker_encoder = torch.nn.Conv1d(1, 128, 400, stride=160)
+        self.embeddings = torch.nn.ModuleList(
+            [torch.nn.Embedding(CODEBOOK_SIZE + 2, dim) for _ in range(NUM_CODEBOOKS)]
+        )
+        self.backbone = torch.nn.GRUCell(dim, dim)
+        self.heads = torch.nn.Linear(dim, NUM_CODEBOOKS * (CODEBOOK_SIZE + 1))
+
+    @classmethod
+    def from_pretrained(cls, repo_id: str, device: str = "cpu"):
+        return cls().to(device)
+
+    @torch.inference_mode()
+    def make_speaker_embedding(self, wav: torch.Tensor, sr: int) -> torch.Tensor:
+        wav = self.autoencoder.preprocess(wav.mean(0, keepdim=True), sr)
+        return self.speaker_encoder(wav.unsqueeze(0)).mean(-1)
+
+    @torch.inference_mode()
+    def prepare_conditioning(self, cond_dict: dict, uncond_dict=None) -> torch.Tensor:
+        cond = self.prefix_conditioner(cond_dict, lambda name: True)
+        uncond = self.prefix_conditioner(cond_dict, lambda name: False)
+        return torch.cat([cond, uncond])
+
+    def _step(self, input_ids: torch.Tensor, hidden: torch.Tensor, cfg_scale: float) -> torch.Tensor:
+        x = sum(self.embeddings[k](input_ids[:, k, 0]) for k in range(NUM_CODEBOOKS))
+        hidden.copy_(self.backbone(torch.cat([x, x]), hidden))
+        logits = self.heads(hidden).view(hidden.shape[0], NUM_CODEBOOKS, -1)
+        cond, uncond = logits.chunk(2)
+        return uncond + (cond - uncond) * cfg_scale
+
+    @staticmethod
+    def _sample(logits: torch.Tensor, top_k: int = 50, **_) -> torch.Tensor:
+        # Like Zonos, filter the full distribution and sample token ids from it directly
+        pivot = logits.topk(min(max(top_k, 1), logits.shape[-1]), dim=-1).values[..., -1:]
+        probs = logits.masked_fill(logits < pivot, -math.inf).softmax(-1)
+        # Looked up per call, as Zonos does, so the server's seeded sampling hook applies
+        return sys.modules["zonos.sampling"].multinomial(probs, 1)
+
+    @torch.inference_mode()
+    def generate(self, prefix_conditioning: torch.Tensor, audio_prefix_codes=None,
+                 max_new_tokens: int = 86 * 30, cfg_scale: float = 2.0, batch_size: int = 1,
+                 sampling_params: dict = None, progress_bar: bool = True, callback=None, **_):
+        sampling_params = sampling_params or {}
+        prefix_len = 0 if audio_prefix_codes is None else audio_prefix_codes.shape[2]
+        codes = torch.full((batch_size, NUM_CODEBOOKS, prefix_len + max_new_tokens), -1)
+        if audio_prefix_codes is not None:
+            codes[..., :prefix_len] = audio_prefix_codes
+        codes = F.pad(codes, (0, NUM_CODEBOOKS), value=MASKED_TOKEN)
+        delayed = torch.stack([codes[:, k].roll(k + 1) for k in range(NUM_CODEBOOKS)], dim=1)
+
+        # Prefill: conditioning sets the state, then the prefix codes run through the backbone
+        hidden = prefix_conditioning.float().mean(1).clone()
+        for position in range(prefix_len + 1):
+            logits = self._step(delayed[..., position:position + 1], hidden, cfg_scale)
+        target = prefix_len + FRAMES_PER_TOKEN * prefix_conditioning.shape[1]
+
+        def sample(logits, offset):
+            logits[:, 1:, EOS_TOKEN] = -math.inf
+            if offset - 1 >= target:
+                logits[:, 0] = -math.inf
+                logits[:, 0, EOS_TOKEN] = 0.0
+            else:
+                logits[:, 0, EOS_TOKEN] = -math.inf
+            return self._sample(logits, **sampling_params)
+
+        offset = prefix_len + 1
+        frame = delayed[..., offset:offset + 1]
+        frame.masked_scatter_(frame == -1, sample(logits, offset))
+
+        stopping = torch.zeros(batch_size, dtype=torch.bool)
+        max_steps = delayed.shape[2] - offset
+        remaining = torch.full((batch_size,), max_steps)
+        step = 0
+        while remaining.max() > 0:
+            offset += 1
+            logits = self._step(delayed[..., offset - 1:offset], hidden, cfg_scale)
+            next_token = sample(logits, offset)
+            eos = next_token[:, 0, 0] == EOS_TOKEN
+            remaining[eos] = torch.minimum(remaining[eos], torch.tensor(NUM_CODEBOOKS))
+            stopping |= eos
+            eos_codebook = (NUM_CODEBOOKS - remaining).clamp(max=NUM_CODEBOOKS - 1)
+            for row in range(batch_size):
+                if stopping[row]:
+                    index = int(eos_codebook[row])
+                    next_token[row, :index] = MASKED_TOKEN
+                    next_token[row, index] = EOS_TOKEN
+            frame = delayed[..., offset:offset + 1]
+            frame.masked_scatter_(frame == -1, next_token)
+            remaining -= 1
+            step += 1
+            if callback is not None and not callback(frame, step, max_steps):
+                break
+
+        total = delayed.shape[2]
+        out = torch.stack(
+            [delayed[:, k, k + 1:total - NUM_CODEBOOKS + k + 1] for k in range(NUM_CODEBOOKS)], dim=1
+        )
+        out.masked_fill_(out >= CODEBOOK_SIZE, 0)
+        return out[..., :offset - NUM_CODEBOOKS]
+
+def multinomial(input: torch.Tensor, num_samples: int, replacement: bool = False, *, generator=None):
+    """``zonos.sampling.multinomial``: an exponential-noise draw over the last dimension."""
+    if num_samples == 1:
+        noise = torch.empty_like(input).exponential_(1, generator=generator)
+        return torch.argmax(input / noise, dim=-1, keepdim=True).to(torch.int64)
+    flat = torch.multinomial(input.reshape(-1, input.shape[-1]), num_samples, replacement, generator=generator)
+    return flat.reshape(*input.shape[:-1], -1)
+
+def make_cond_dict(text="", language="en-us", speaker=None, emotion=None, fmax=22050.0,
+                   pitch_std=20.0, speaking_rate=15.0, vqscore_8=None, ctc_loss=0.0,
+                   dnsmos_ovrl=4.0, speaker_noised=False,
+                   unconditional_keys=("vqscore_8", "dnsmos_ovrl"), device="cpu"):
+    cond_dict = {
+        "espeak": ([text], [language]), "speaker": speaker, "emotion": emotion, "fmax": fmax,
+        "pitch_std": pitch_std, "speaking_rate": speaking_rate, "vqscore_8": vqscore_8,
+        "dnsmos_ovrl": dnsmos_ovrl, "speaker_noised": int(speaker_noised),
+    }
+    for key in unconditional_keys:
+        cond_dict.pop(key, None)
+    for key, value in cond_dict.items():
+        if isinstance(value, (float, int)):
+            value = torch.tensor([value])
+        if isinstance(value, torch.Tensor):
+            cond_dict[key] = value.view(1, 1, -1).to(device)
+    return cond_dict
+
+def install_zonos_shim() -> str:
+    """Make ``import zonos`` work, returning which implementation is in use."""
+    try:
+        import zonos.model  # noqa: F401
+        import zonos.conditioning  # noqa: F401
+        import zonos.sampling  # noqa: F401
+        return "zonos"
+    except ImportError:
+        pass
+    package = types.ModuleType("zonos")
+    package.__path__ = []
+    model = types.ModuleType("zonos.model")
+    model.Zonos = TinyZonos
+    model.DEFAULT_BACKBONE_CLS = type("TinyBackbone", (), {"supported_architectures": ["transformer"]})
+    conditioning = types.ModuleType("zonos.conditioning")
+    conditioning.make_cond_dict = make_cond_dict
+    conditioning.supported_language_codes = ["en-us"]
+    conditioning.phonemize = lambda texts, languages: [text.lower() for text in texts]
+    sampling = types.ModuleType("zonos.sampling")
+    sampling.multinomial = multinomial
+    package.model, package.conditioning, package.sampling = model, conditioning, sampling
+    sys.modules.update({"zonos": package, "zonos.model": model, "zonos.conditioning": conditioning,
+                        "zonos.sampling": sampling})
+    return "shim"
+
+def load_server():
+    """Import the server modules with model loads redirected to the stand-in."""
+    implementation = install_zonos_shim()
+    import synthesis
+    synthesis.MODEL_MANAGER.loader = lambda model_choice: TinyZonos().to(synthesis.DEFAULT_DEVICE).eval()
+    import tts_server
+    return implementation, synthesis, tts_server
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def write_test_wav(path: str, seconds: float = 3.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    samples = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(SAMPLE_RATE)
+        writer.writeframes(samples.tobytes())
+
+def read_wav(path: str):
+    with wave.open(path, 'rb') as reader:
+        samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype='<i2')
+        return torch.from_numpy(samples.astype('float32') / 32768).unsqueeze(0), reader.getframerate()
+
+def timed(fn: Callable, repeat: int) -> Dict:
+    """Run ``fn`` ``repeat`` times; the result of the last run is returned alongside timings."""
+    seconds = []
+    result = None
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            seconds.append(time.perf_counter() - start)
+    except Exception as e:
+        return {"error": str(e)}
+    return {
+        "seconds": statistics.median(seconds),
+        "min": min(seconds),
+        "runs": len(seconds),
+        "_result": result,
+    }
+
+def public(stats: Dict) -> Dict:
+    return {k: v for k, v in stats.items() if not k.startswith("_")}
+
+def bench_stages(synthesis, audio_path: str, repeat: int) -> Dict:
+    from audio_transport import pack_audio
+
+    stages = {}
+    load_runs = iter(range(repeat))
+    stages["model_load"] = public(timed(
+        lambda: synthesis.MODEL_MANAGER.get(f"{STANDIN_MODEL}-load-{next(load_runs)}"), repeat
+    ))
+    model = synthesis.load_model_if_needed(STANDIN_MODEL)
+    base = {"model_choice": STANDIN_MODEL, "seed": 0, "randomize_seed": False}
+
+    # The model-level timings bypass the speaker, prefix and conditioning caches;
+    # the *_cached ones go through synthesis after one warm-up call
+    wav, sr = read_wav(audio_path)
+    stages["speaker_embedding"] = public(timed(lambda: model.make_speaker_embedding(wav, sr), repeat))
+    stages["prefix_encode"] = public(timed(
+        lambda: model.autoencoder.encode(model.autoencoder.preprocess(wav, sr).unsqueeze(0)), repeat
+    ))
+    speaker_params = {**base, "speaker_audio": audio_path}
+    prefix_params = {**base, "prefix_audio": audio_path}
+    stages["speaker_embedding_cached"] = public(timed(
+        lambda: synthesis.get_speaker_embedding(model, speaker_params), repeat + 1
+    ))
+    stages["prefix_encode_cached"] = public(timed(
+        lambda: synthesis.encode_prefix_audio(model, prefix_params), repeat + 1
+    ))
+
+    per_text = {}
+    for name, text in CORPUS.items():
+        params = {**base, "text": text}
+        cond_dict = synthesis.make_conditioning_dict(params, None)
+        conditioning = timed(lambda: model.prepare_conditioning(cond_dict), repeat)
+        synthesis.make_conditioning(model, params, None)
+        cached = timed(lambda: synthesis.make_conditioning(model, params, None), repeat)
+        if "error" in conditioning:
+            per_text[name] = {"prepare_conditioning": conditioning}
+            continue
+
+        generate = timed(lambda: model.generate(
+            prefix_conditioning=conditioning["_result"],
+            max_new_tokens=synthesis.MAX_NEW_TOKENS,
+            cfg_scale=2.0,
+            sampling_params=synthesis.sampling_params_from(params),
+            progress_bar=False,
+        ), repeat)
+        codes = generate["_result"]
+        frames = int(codes.shape[-1])
+        decode = timed(lambda: model.autoencoder.decode(codes), repeat)
+        audio = synthesis.to_audio_array(decode["_result"])
+        audio_seconds = audio.shape[-1] / SAMPLE_RATE
+
+        serialize_json = timed(lambda: json.dumps({"data": pack_audio(audio, SAMPLE_RATE)[0]}), repeat)
+        serialize_binary = timed(lambda: pack_audio(audio, SAMPLE_RATE, transport="binary"), repeat)
+        per_text[name] = {
+            "chars": len(text),
+            "frames": frames,
+            "audioSeconds": audio_seconds,
+            "prepare_conditioning": public(conditioning),
+            "prepare_conditioning_cached": public(cached),
+            "generate": {**public(generate), "tokensPerSecond": frames / generate["seconds"]},
+            "decode": public(decode),
+            "serialize_json": {**public(serialize_json), "bytes": len(serialize_json["_result"])},
+            "serialize_binary": {**public(serialize_binary), "bytes": len(serialize_binary["_result"][1])},
+            "realTimeFactor": (generate["seconds"] + decode["seconds"]) / audio_seconds,
+        }
+    stages["texts"] = per_text
+    return stages
+
+def bench_commands(tts_server, repeat: int) -> Dict:
+    """End-to-end ``handle_command`` latency per corpus text."""
+    # Server events (tier announcements, model status) would interleave with the report on stdout
+    tts_server.emit = lambda message, payload=None: None
+    tts_server.init()
+    results = {}
+    for name, text in CORPUS.items():
+        command = {"type": "generate-audio", "params": {
+            "model_choice": STANDIN_MODEL, "text": text, "seed": 0, "randomize_seed": False,
+        }}
+        stats = timed(lambda: tts_server.handle_command(json.loads(json.dumps(command))), repeat)
+        response = stats.get("_result") or {}
+        if not response.get("success"):
+            results[name] = {"error": stats.get("error") or response.get("error")}
+            continue
+        audio_seconds = len(response["data"][1]) / response["data"][0]
+        results[name] = {
+            **public(stats),
+            "audioSeconds": audio_seconds,
+            "realTimeFactor": stats["seconds"] / audio_seconds,
+        }
+    return results
+
+def serve():
+    """Run the stdio server with the stand-in model, for ``bench_stdio``."""
+    _, _, tts_server = load_server()
+    tts_server.main()
+
+def bench_stdio(home: str, repeat: int) -> Dict:
+    """Drive ``tts_server.main`` in a subprocess over its JSON-lines protocol."""
+    env = {**os.environ, "HOME": home, "VOICEPRO_DEFAULT_MODEL": STANDIN_MODEL}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    next_id = iter(range(1_000_000))
+
+    def request(command: dict) -> dict:
+        request_id = f"bench-{next(next_id)}"
+        process.stdin.write(json.dumps({**command, "id": request_id}) + "\n")
+        process.stdin.flush()
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("Server exited")
+            message = json.loads(line)
+            if message.get("id") == request_id:
+                if not message.get("success"):
+                    raise RuntimeError(message.get("error"))
+                return message
+
+    results = {}
+    try:
+        request({"type": "get_models"})
+        results["startup"] = {"seconds": time.perf_counter() - start}
+        results["get_models"] = public(timed(lambda: request({"type": "get_models"}), repeat))
+        for name, text in CORPUS.items():
+            command = {"type": "generate-audio", "params": {
+                "model_choice": STANDIN_MODEL, "text": text, "seed": 0, "randomize_seed": False,
+            }}
+            results[f"generate_{name}"] = public(timed(lambda: request(command), repeat))
+    except Exception as e:
+        results["error"] = str(e)
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    results["peakRssMb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return results
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (median reported)")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--skip-stdio", action="store_true", help="skip the subprocess stdio benchmark")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve()
+        return
+
+    # Keep caches, projects and history out of the real ~/.voicepro, and stay on CPU
+    home = tempfile.mkdtemp(prefix="voicepro-bench-")
+    os.environ["HOME"] = home
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["VOICEPRO_DEFAULT_MODEL"] = STANDIN_MODEL
+    torch.manual_seed(0)
+
+    started = time.perf_counter()
+    implementation, synthesis, tts_server = load_server()
+    audio_path = os.path.join(home, "reference.wav")
+    write_test_wav(audio_path)
+
+    results = {
+        "revision": git_revision(),
+        "environment": {
+            "python": sys.version.split()[0],
+            "torch": torch.__version__,
+            "device": synthesis.DEFAULT_DEVICE,
+            "threads": torch.get_num_threads(),
+            "zonos": implementation,
+        },
+        "import": {"seconds": time.perf_counter() - started},
+        "stages": bench_stages(synthesis, audio_path, args.repeat),
+        "commands": bench_commands(tts_server, args.repeat),
+    }
+    results["peakRssMb"] = peak_rss_mb()
+    if not args.skip_stdio:
+        results["stdio"] = bench_stdio(tempfile.mkdtemp(prefix="voicepro-bench-"), args.repeat)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
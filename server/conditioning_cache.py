@@ -0,0 +1,63 @@
+import os
+import threading
+import torch
+import zonos.conditioning as zonos_conditioning
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Hashable, List
+
+_phonemize = getattr(zonos_conditioning, "phonemize", None)
+
+@lru_cache(maxsize=int(os.environ.get('VOICEPRO_PHONEME_CACHE_SIZE', 4096)))
+def phonemize_one(text: str, language: str):
+    return _phonemize([text], [language])[0]
+
+def cached_phonemize(texts: List[str], languages: List[str]) -> list:
+    """Drop-in for ``zonos.conditioning.phonemize`` that remembers each text's phonemes."""
+    return [phonemize_one(text, language) for text, language in zip(texts, languages)]
+
+class PhonemeCacheStats:
+    """The phoneme cache's hit and miss counts, shaped like the other caches."""
+
+    @property
+    def hits(self) -> int:
+        return phonemize_one.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return phonemize_one.cache_info().misses
+
+PHONEME_CACHE_STATS = PhonemeCacheStats()
+
+def install_phoneme_cache():
+    # The espeak conditioner looks phonemize up on the module at call time
+    if _phonemize is not None:
+        zonos_conditioning.phonemize = cached_phonemize
+
+class ConditioningCache:
+    """Bounded LRU of prepared prefix-conditioning tensors.
+
+    Entries stay on the model's device; the caller's key must cover
+    everything that goes into the conditioning dict.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], torch.Tensor]) -> torch.Tensor:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        tensor = compute()
+        with self.lock:
+            self.entries[key] = tensor
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return tensor
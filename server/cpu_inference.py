@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import torch
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+from atomic_files import atomic_write
+from tensor_cache import CACHE_DIR, model_slug
+
+# Dynamic int8 quantization of the backbone on CPU; opt-in (VOICEPRO_CPU_QUANTIZE=1) since it changes the output
+QUANTIZE = os.environ.get('VOICEPRO_CPU_QUANTIZE', '0') == '1'
+# Zonos compiles its decode step unless told not to; on CPU that needs a C++ toolchain, so it is opt-in
+TORCH_COMPILE = os.environ.get('VOICEPRO_TORCH_COMPILE', '0') == '1'
+QUANTIZED_DIR = CACHE_DIR / 'quantized'
+# Inference worker processes for generate-audio (see worker_pool.py); 0 or 1 runs in-process
+WORKERS = int(os.environ.get('VOICEPRO_WORKERS', 0))
+# Map one on-disk copy of the weights into every process instead of loading a copy each
+SHARED_WEIGHTS = os.environ.get('VOICEPRO_SHARED_WEIGHTS', '1' if WORKERS > 1 else '0') == '1'
+SHARED_DIR = CACHE_DIR / 'shared'
+
+def cpu_threads() -> int:
+    if os.environ.get('VOICEPRO_CPU_THREADS'):
+        return max(1, int(os.environ['VOICEPRO_CPU_THREADS']))
+    try:
+        # Respects taskset/affinity limits, unlike os.cpu_count()
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+def configure_threads():
+    """Size torch's thread pools for single-stream autoregressive decoding.
+
+    Each decode step is a chain of small matmuls, so one interop thread
+    avoids oversubscribing the cores the intra-op pool already uses.
+    """
+    torch.set_num_threads(cpu_threads())
+    try:
+        torch.set_num_interop_threads(int(os.environ.get('VOICEPRO_CPU_INTEROP_THREADS', 1)))
+    except RuntimeError as e:
+        # Only settable before the first parallel op has run
+        print(f"Could not set interop threads: {str(e)}", file=sys.stderr)
+
+def model_variant(device: str) -> str:
+    """Name of the weights variant in use, for anything keyed on model output."""
+    # Shared weights stay full precision: packed int8 weights can't be memory-mapped
+    return "int8" if QUANTIZE and device == 'cpu' and not SHARED_WEIGHTS else "full"
+
+class QuantizedLinear(torch.nn.Module):
+    """Dynamic int8 Linear that takes and returns the surrounding dtype.
+
+    Quantized kernels only accept float32, while Zonos keeps its weights
+    and KV cache in bfloat16.
+    """
+
+    def __init__(self, linear: torch.nn.Linear):
+        super().__init__()
+        wrapper = torch.nn.Sequential(torch.nn.Linear(linear.in_features, linear.out_features,
+                                                      bias=linear.bias is not None))
+        wrapper[0].load_state_dict({k: v.float() for k, v in linear.state_dict().items()})
+        self.linear = torch.ao.quantization.quantize_dynamic(wrapper, {torch.nn.Linear}, dtype=torch.qint8)[0]
+        self.dtype = linear.weight.dtype
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.linear(x.float()).to(self.dtype)
+
+def quantize_linears(module: torch.nn.Module) -> int:
+    count = 0
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear):
+            setattr(module, name, QuantizedLinear(child))
+            count += 1
+        else:
+            count += quantize_linears(child)
+    return count
+
+def weights_signature(model_id: str) -> str:
+    """Identify the downloaded checkpoint cheaply, so a new snapshot re-quantizes."""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        path = try_to_load_from_cache(model_id, "model.safetensors")
+        if isinstance(path, str):
+            stat = os.stat(path)
+            return f"{stat.st_size}-{stat.st_mtime_ns}"
+    except Exception:
+        pass
+    return "local"
+
+def quantized_path(model_id: str) -> Path:
+    version = model_slug(torch.__version__)
+    return QUANTIZED_DIR / model_slug(model_id) / f"{version}-{weights_signature(model_id)}.pt"
+
+def quantize_backbone(model, model_id: str):
+    """Swap the backbone for its int8 variant, reusing the on-disk copy when present."""
+    path = quantized_path(model_id)
+    if path.exists():
+        try:
+            model.backbone = torch.load(path, map_location='cpu', weights_only=False)
+            print(f"Loaded quantized backbone from {path}", file=sys.stderr)
+            return model
+        except Exception as e:
+            print(f"Error loading quantized backbone, re-quantizing: {str(e)}", file=sys.stderr)
+
+    start = time.perf_counter()
+    count = quantize_linears(model.backbone)
+    print(f"Quantized {count} backbone linear layers in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(path, 'wb') as f:
+            torch.save(model.backbone, f)
+    except Exception as e:
+        print(f"Error caching quantized backbone: {str(e)}", file=sys.stderr)
+    return model
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock across processes, where the platform supports it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def shared_path(model_id: str) -> Path:
+    version = model_slug(torch.__version__)
+    return SHARED_DIR / model_slug(model_id) / f"{version}-{weights_signature(model_id)}.pt"
+
+def load_shared(model_id: str, load: Callable[[str], torch.nn.Module]):
+    """Load ``model_id`` memory-mapped from a snapshot every process shares.
+
+    The first process to need the model writes the snapshot from ``load``;
+    later ones, and later starts, map it read-only, so resident memory for
+    the weights is paid once however many workers are running.
+    """
+    path = shared_path(model_id)
+    with file_lock(path.with_suffix('.lock')):
+        if not path.exists():
+            start = time.perf_counter()
+            model = load(model_id)
+            with atomic_write(path, 'wb') as f:
+                torch.save(model, f)
+            del model
+            print(f"Wrote shared weights for {model_id} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return torch.load(path, map_location='cpu', mmap=True, weights_only=False)
+
+def generate_options(model, device: str) -> dict:
+    """Extra ``model.generate`` arguments for how this model was prepared."""
+    if device != 'cpu':
+        # Zonos' own default, compiling the decode step, stays in place on GPU
+        return {}
+    return {"disable_torch_compile": not getattr(model, "torch_compile", False)}
+
+def warm_up(model, conditioning: torch.Tensor, frames: int = 16) -> Optional[float]:
+    """Run a short generation so torch.compile's first-call cost is paid at load.
+
+    Falls back to eager decoding for this model if compilation fails.
+    """
+    start = time.perf_counter()
+    try:
+        model.torch_compile = True
+        model.generate(prefix_conditioning=conditioning, max_new_tokens=frames, batch_size=1,
+                       progress_bar=False, disable_torch_compile=False)
+    except Exception as e:
+        print(f"torch.compile warm-up failed, decoding eagerly: {str(e)}", file=sys.stderr)
+        model.torch_compile = False
+        return None
+    seconds = time.perf_counter() - start
+    print(f"Compiled decode step in {seconds:.1f}s", file=sys.stderr)
+    return seconds
@@ -0,0 +1,85 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+from metrics import REQUEST_SECONDS, Trace, activate
+
+class CommandDispatcher:
+    """Routes stdio commands to worker threads and tags responses with their id.
+
+    Inference commands run on a small pool of request threads that hand the
+    model work to the inference scheduler, so a long generation never blocks
+    project and settings commands, which are served in order on a separate
+    control thread. Inference commands that are still queued or running can
+    be cancelled by id.
+    """
+
+    def __init__(self, handler: Callable, emit: Callable, inference_commands: Set[str],
+                 request_workers: int = 8):
+        self.handler = handler
+        self.emit = emit
+        self.inference_commands = inference_commands
+        self.control = ThreadPoolExecutor(max_workers=1, thread_name_prefix='control')
+        self.requests = ThreadPoolExecutor(max_workers=request_workers, thread_name_prefix='request')
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, command: dict):
+        if command.get("type") == "cancel":
+            cancelled = self.cancel(command.get("targetId"))
+            self._respond(command.get("id"), {"success": True, "data": cancelled})
+        elif command.get("type") in self.inference_commands:
+            cancel_event = threading.Event()
+            if command.get("id") is not None:
+                with self.lock:
+                    self.cancel_events[command["id"]] = cancel_event
+            self.requests.submit(self._run_inference, command, cancel_event)
+        else:
+            self.control.submit(self._run, command, None)
+
+    def cancel(self, request_id: Optional[str]) -> bool:
+        with self.lock:
+            cancel_event = self.cancel_events.get(request_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def shutdown(self):
+        self.requests.shutdown(wait=True)
+        self.control.shutdown(wait=True)
+
+    def _run_inference(self, command: dict, cancel_event: threading.Event):
+        if cancel_event.is_set():
+            self._finish(command.get("id"), {"success": False, "error": "Cancelled", "cancelled": True})
+            return
+        self._run(command, cancel_event)
+
+    def _run(self, command: dict, cancel_event: Optional[threading.Event]):
+        trace = Trace()
+        start = time.perf_counter()
+        try:
+            with activate([trace]):
+                result = self.handler(command, cancel_event=cancel_event)
+        except Exception as e:
+            print(f"Error dispatching command: {str(e)}", file=sys.stderr)
+            result = {"success": False, "error": str(e)}
+        REQUEST_SECONDS.observe(time.perf_counter() - start, command=str(command.get("type")))
+        # Stage timings ride along as optional metadata on the response
+        timings = trace.as_dict()
+        if timings:
+            result["timings"] = timings
+        self._finish(command.get("id"), result)
+
+    def _finish(self, request_id: Optional[str], result: dict):
+        if request_id is not None:
+            with self.lock:
+                self.cancel_events.pop(request_id, None)
+        self._respond(request_id, result)
+
+    def _respond(self, request_id: Optional[str], result: dict):
+        payload = result.pop("_payload", None)
+        if request_id is not None:
+            result["id"] = request_id
+        self.emit(result, payload)
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import threading
+from collections import deque
+from dataclasses import asdict
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+from atomic_files import atomic_write
+
+class HistoryLog:
+    """History kept as an append-only JSON-lines file.
+
+    Each action appends one line, so recording history costs the same no
+    matter how long it is. Removals are appended as ``{"removed": id}``
+    records. Only the newest ``retention`` entries are kept; the file is
+    rewritten without the dropped lines once it holds twice that many.
+    """
+
+    def __init__(self, path: Path, entry_type, retention: int = 1000,
+                 legacy_path: Optional[Path] = None):
+        self.path = path
+        self.entry_type = entry_type
+        self.retention = max(1, retention)
+        self.entries = deque(maxlen=self.retention)
+        self.lines = 0
+        self.lock = threading.Lock()
+
+        if not self.path.exists() and legacy_path is not None and legacy_path.exists():
+            self._migrate(legacy_path)
+        self._truncate_torn_line()
+        self._load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _migrate(self, legacy_path: Path):
+        # history.json stored the whole list, newest first
+        with open(legacy_path) as f:
+            legacy = json.load(f)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for entry in reversed(legacy):
+                f.write(json.dumps(entry) + "\n")
+        legacy_path.rename(legacy_path.with_suffix('.json.migrated'))
+
+    def _truncate_torn_line(self):
+        """Drop a partial last line left by a crash mid-append, so appends start on a fresh line."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Torn lines are short, but read back in blocks until a newline turns up
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            f.truncate(end)
+        print(f"Dropped a partial last line from {self.path}", file=sys.stderr)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        entries = {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                self.lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-append can leave a partial last line
+                    print(f"Skipping corrupt history line in {self.path}", file=sys.stderr)
+                    continue
+                if "removed" in record:
+                    entries.pop(record["removed"], None)
+                else:
+                    entries[record["id"]] = self.entry_type(**record)
+        self.entries.extend(entries.values())
+
+    def _write(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.lines += 1
+        if self.lines > 2 * self.retention:
+            self._compact()
+
+    def _compact(self):
+        with atomic_write(self.path, encoding='utf-8') as f:
+            for entry in self.entries:
+                f.write(json.dumps(asdict(entry)) + "\n")
+            # Closed before the replace, which Windows refuses on an open file
+            self.file.close()
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.lines = len(self.entries)
+
+    def append(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+            self._write(asdict(entry))
+
+    def find(self, entry_id: str):
+        with self.lock:
+            for entry in self.entries:
+                if entry.id == entry_id:
+                    return entry
+        return None
+
+    def remove(self, entry_id: str) -> bool:
+        with self.lock:
+            for entry in self.entries:
+                if entry.id == entry_id:
+                    self.entries.remove(entry)
+                    self._write({"removed": entry_id})
+                    return True
+        return False
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.file.close()
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self.lines = 0
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> List:
+        """Entries newest first, skipping ``offset`` and returning at most ``limit``."""
+        with self.lock:
+            stop = None if limit is None else offset + limit
+            return list(islice(reversed(self.entries), offset, stop))
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,279 @@
+import os
+import wave
+import threading
+from typing import Callable, Optional
+from zonos.model import DEFAULT_BACKBONE_CLS as ZonosBackbone
+from zonos.conditioning import supported_language_codes
+from audio_transport import encode_samples, pack_audio
+from synthesis import (
+    DEFAULT_DEVICE, MODEL_MANAGER, GenerationCancelled, load_model_if_needed, load_prefix_registry,
+    generate_audio, generate_variants, register_prefix, resolve_seed, stream_audio
+)
+from long_form import stream_long_audio
+from result_cache import ResultCache, result_key
+from render_jobs import RenderQueue
+from worker_pool import WorkerPool
+from cpu_inference import WORKERS
+from metrics import METRICS, span
+
+# Finished waveforms for requests that opt in with use_cache (or the cacheResults setting)
+RESULT_CACHE = ResultCache(max_bytes=int(float(os.environ.get('VOICEPRO_RESULT_CACHE_MB', 1024)) * 1024 * 1024))
+METRICS.register_cache("results", RESULT_CACHE)
+
+# Set by start() once the server hands over its project manager and stdout writer
+project_manager = None
+emit: Optional[Callable] = None
+render_queue: Optional[RenderQueue] = None
+# generate-audio runs in worker processes when VOICEPRO_WORKERS > 1 on CPU
+pool: Optional[WorkerPool] = None
+
+def start(manager, emit_message: Callable):
+    """Wire the inference tier into the running server."""
+    global project_manager, emit, render_queue, pool
+    project_manager = manager
+    emit = emit_message
+    if WORKERS > 1 and DEFAULT_DEVICE == 'cpu':
+        pool = WorkerPool(WORKERS, manager.settings.defaultModel,
+                          on_cancel=lambda: GenerationCancelled("Cancelled"))
+        METRICS.gauge("voicepro_pool_busy_workers", "Inference worker processes generating.",
+                      lambda: [({}, pool.busy)])
+    render_queue = RenderQueue(
+        manager.app_dir / 'render_jobs',
+        manager.projects_dir,
+        manager.render_params,
+        emit_message
+    )
+    MODEL_MANAGER.on_change = lambda status: emit_message({"event": "model-status", "data": status})
+
+def resume():
+    """Start background work once the tier has been announced."""
+    # Load the default model in the background so the first generation doesn't pay for it;
+    # pool workers preload their own
+    if pool is None:
+        MODEL_MANAGER.preload(project_manager.settings.defaultModel)
+    render_queue.resume()
+
+def describe() -> dict:
+    return {"device": DEFAULT_DEVICE, "models": supported_models(), "workers": pool.size() if pool else 0}
+
+def supported_models() -> list:
+    supported_models = []
+    if 'transformer' in ZonosBackbone.supported_architectures:
+        supported_models.append('Zyphra/Zonos-v0.1-transformer')
+    if 'hybrid' in ZonosBackbone.supported_architectures:
+        supported_models.append('Zyphra/Zonos-v0.1-hybrid')
+    return supported_models
+
+def stream_generate_audio(request_id: Optional[str], params: dict,
+                          cancel_event: Optional[threading.Event] = None):
+    transport = params.get("transport", "json")
+    dtype = params.get("dtype", "float32")
+    chunk_seconds = float(params.get("chunk_seconds", 1.0))
+    params = resolve_seed(params)
+
+    seq = 0
+    frames = 0
+    sample_rate = None
+    chunks = stream_audio(params, chunk_seconds=chunk_seconds, cancel_event=cancel_event)
+    for sample_rate, chunk in chunks:
+        with span("serialize"):
+            data, payload = pack_audio(chunk, sample_rate, transport=transport, dtype=dtype)
+        emit({"event": "audio-chunk", "requestId": request_id, "seq": seq, "data": data}, payload)
+        seq += 1
+        frames += int(chunk.shape[-1])
+
+    return {
+        "success": True,
+        "data": {
+            "requestId": request_id,
+            "sampleRate": sample_rate,
+            "frames": frames,
+            "chunks": seq,
+            "seed": params["seed"],
+        }
+    }
+
+def generate_long_audio(request_id: Optional[str], params: dict,
+                        cancel_event: Optional[threading.Event] = None):
+    transport = params.get("transport", "json")
+    dtype = params.get("dtype", "float32")
+    output_path = params.get("output_path")
+    params = resolve_seed(params)
+
+    writer = None
+    frames = 0
+    segments = 0
+    sample_rate = None
+    try:
+        for index, text, sample_rate, audio in stream_long_audio(
+            params,
+            cancel_event=cancel_event,
+            max_chars=int(params.get("max_segment_chars", 200)),
+        ):
+            if output_path:
+                if writer is None:
+                    writer = wave.open(output_path, 'wb')
+                    writer.setnchannels(1)
+                    writer.setsampwidth(2)
+                    writer.setframerate(sample_rate)
+                writer.writeframes(encode_samples(audio, 'int16'))
+            with span("serialize"):
+                data, payload = pack_audio(audio, sample_rate, transport=transport, dtype=dtype)
+            emit({
+                "event": "audio-chunk",
+                "requestId": request_id,
+                "seq": index,
+                "segment": {"index": index, "text": text},
+                "data": data,
+            }, payload)
+            frames += int(audio.shape[-1])
+            segments += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        "success": True,
+        "data": {
+            "requestId": request_id,
+            "sampleRate": sample_rate,
+            "frames": frames,
+            "segments": segments,
+            "outputPath": output_path,
+            "seed": params["seed"],
+        }
+    }
+
+def handle_command(command: dict, cancel_event: Optional[threading.Event] = None):
+    try:
+        if command["type"] == "get_models":
+            return {"success": True, "data": supported_models()}
+
+        elif command["type"] == "get_conditioners":
+            if not command.get("model"):
+                raise ValueError("Model choice is required")
+            model = load_model_if_needed(command["model"])
+            if not model:
+                raise ValueError("Failed to load model")
+            conditioners = [c.name for c in model.prefix_conditioner.conditioners]
+            return {"success": True, "data": conditioners}
+
+        elif command["type"] == "generate-audio":
+            if not command.get("params"):
+                raise ValueError("Parameters are required")
+
+            params = command["params"]
+            if params.get("stream"):
+                request_id = command.get("requestId", command.get("id"))
+                return stream_generate_audio(request_id, params, cancel_event)
+
+            # A randomized request is cached under the seed it drew, so replaying that seed hits
+            params = resolve_seed(params)
+            key = None
+            if params.get("use_cache", project_manager.settings.cacheResults):
+                key = result_key(params)
+            cached = RESULT_CACHE.get(key) if key else None
+            if cached is not None:
+                sample_rate, audio_data = cached
+            else:
+                if pool is not None:
+                    with span("worker"):
+                        sample_rate, audio_data = pool.generate(params, cancel_event)
+                else:
+                    sample_rate, audio_data = generate_audio(params, cancel_event)
+                if key:
+                    RESULT_CACHE.put(key, sample_rate, audio_data)
+
+            with span("serialize"):
+                data, payload = pack_audio(
+                    audio_data,
+                    sample_rate,
+                    transport=params.get("transport", "json"),
+                    dtype=params.get("dtype", "float32"),
+                )
+            result = {"success": True, "data": data, "cached": cached is not None, "seed": params["seed"]}
+            if isinstance(data, dict):
+                data["seed"] = params["seed"]
+            if payload is not None:
+                result["_payload"] = payload
+            return result
+
+        elif command["type"] == "generate-long-audio":
+            if not command.get("params"):
+                raise ValueError("Parameters are required")
+            request_id = command.get("requestId", command.get("id"))
+            return generate_long_audio(request_id, command["params"], cancel_event)
+
+        elif command["type"] == "generate_variants":
+            if not command.get("params"):
+                raise ValueError("Parameters are required")
+            params = command["params"]
+            transport = params.get("transport", "json")
+            if transport == "binary":
+                # Only one binary frame can follow a response line
+                raise ValueError("generate_variants supports the json and file transports")
+            variants = command.get("variants") or [{}] * int(command.get("count", 4))
+            if pool is not None:
+                with span("worker"):
+                    takes = pool.generate_variants(params, variants, cancel_event)
+            else:
+                takes = generate_variants(params, variants, cancel_event=cancel_event)
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled("Cancelled")
+
+            data = []
+            for overrides, (take, outcome) in zip(variants, takes):
+                entry = {"seed": take["seed"], "overrides": overrides}
+                if isinstance(outcome, Exception):
+                    entry["error"] = str(outcome)
+                else:
+                    with span("serialize"):
+                        entry["data"], _ = pack_audio(outcome[1], outcome[0], transport=transport,
+                                                      dtype=params.get("dtype", "float32"))
+                data.append(entry)
+            return {"success": True, "data": data}
+
+        elif command["type"] == "register_prefix":
+            entry = register_prefix(command.get("name"), command["path"], command.get("model"))
+            return {"success": True, "data": entry}
+
+        elif command["type"] == "list_prefixes":
+            return {"success": True, "data": list(load_prefix_registry().values())}
+
+        elif command["type"] == "render_projects":
+            job = render_queue.submit(command.get("projectIds", []))
+            return {"success": True, "data": job}
+
+        elif command["type"] == "get_render_jobs":
+            return {"success": True, "data": render_queue.status(command.get("jobId"))}
+
+        elif command["type"] == "cancel_render":
+            return {"success": True, "data": render_queue.cancel(command["jobId"])}
+
+        elif command["type"] == "get_model_status":
+            return {"success": True, "data": MODEL_MANAGER.status()}
+
+        elif command["type"] == "get_voice_settings":
+            settings = {
+                "supported_languages": supported_language_codes,
+                "parameters": {
+                    "speed": {"min": 0.5, "max": 2.0, "default": 1.0},
+                    "pitch": {"min": 0.5, "max": 2.0, "default": 1.0},
+                    "tone": {"min": 0.0, "max": 1.0, "default": 0.5},
+                    "emotions": {
+                        "linear": {"min": 0.0, "max": 1.0, "default": 0.5},
+                        "confidence": {"min": 0.0, "max": 1.0, "default": 0.5},
+                        "quadratic": {"min": 0.0, "max": 1.0, "default": 0.0},
+                    },
+                    "seed": {"min": 0, "max": 1000000, "default": 0},
+                    "randomize_seed": {"default": True},
+                    "unconditional_k": {"default": ["emotion"]},
+                }
+            }
+            return {"success": True, "data": settings}
+
+        else:
+            raise ValueError(f"Unknown command type: {command['type']}")
+
+    except GenerationCancelled:
+        return {"success": False, "error": "Cancelled", "cancelled": True}
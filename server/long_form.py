@@ -0,0 +1,124 @@
+import re
+import math
+import threading
+import torch
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from metrics import activate, active_traces, span
+from synthesis import (
+    FRAME_RATE, SCHEDULER, GenerationCancelled, encode_prefix_audio, generate_codes, load_model_if_needed,
+    resolve_seed, to_audio_array
+)
+
+SENTENCE_END = re.compile(r'(?<=[.!?…。！？])\s+')
+
+def _wrap(sentence: str, max_chars: int) -> List[str]:
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    current = ''
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _tail_words(text: str, fraction: float) -> str:
+    """The last ``fraction`` of ``text``'s words, assuming they are spoken at an even pace."""
+    words = text.split()
+    return " ".join(words[-max(1, math.ceil(len(words) * fraction)):])
+
+def split_text(text: str, max_chars: int = 200) -> List[str]:
+    """Split text into segments of whole sentences of at most ``max_chars``.
+
+    Paragraph breaks always end a segment; sentences longer than the limit
+    are wrapped on whitespace.
+    """
+    segments = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = ' '.join(paragraph.split())
+        current = ''
+        for sentence in SENTENCE_END.split(paragraph):
+            for piece in _wrap(sentence, max_chars):
+                if current and len(current) + 1 + len(piece) > max_chars:
+                    segments.append(current)
+                    current = piece
+                else:
+                    current = f"{current} {piece}".strip()
+        if current:
+            segments.append(current)
+    return segments
+
+def _decode_segment(model, codes: torch.Tensor, context: Optional[torch.Tensor], traces=()):
+    if codes.shape[-1] == 0:
+        return np.zeros(0, dtype='float32')
+    # Decode with a few frames of the previous segment so the joins don't click
+    if context is not None:
+        codes = torch.cat([context.to(codes), codes], dim=-1)
+    with activate(traces), span("decode"):
+        wav = model.autoencoder.decode(codes)
+    skip = 0 if context is None else context.shape[-1] * (wav.shape[-1] // codes.shape[-1])
+    return to_audio_array(wav[..., skip:])
+
+def stream_long_audio(params: dict, cancel_event: Optional[threading.Event] = None,
+                      max_chars: int = 200, max_prefix_seconds: float = 15.0,
+                      context_frames: int = 8):
+    """Synthesize arbitrarily long text segment by segment.
+
+    Yields ``(index, text, sample_rate, audio)`` for each segment in order.
+    Each segment is generated with the previous one as ``audio_prefix_codes``
+    and that segment's text prepended, so voice and prosody carry over; the
+    prefix itself is not repeated in the output. A previous segment longer
+    than ``max_prefix_seconds`` contributes only its last
+    ``max_prefix_seconds`` and the matching share of its words. Decoding a segment runs on a
+    separate thread while the next one is generated.
+    """
+    if not params.get("model_choice"):
+        raise ValueError("Model choice is required")
+    segments = split_text(params.get("text", ""), max_chars)
+    if not segments:
+        raise ValueError("Text is required")
+    # Every segment samples from the same seed, so a randomized request is still one take
+    params = resolve_seed(params)
+
+    model = load_model_if_needed(params["model_choice"])
+    sample_rate = int(model.autoencoder.sampling_rate)
+    max_prefix_frames = int(max_prefix_seconds * FRAME_RATE)
+    user_prefix = SCHEDULER.call(encode_prefix_audio, model, params).result()
+
+    decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='decode')
+    pending = None
+    previous_codes = None
+    previous_text = None
+    try:
+        for index, segment in enumerate(segments):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled("Cancelled")
+
+            prefix = user_prefix if index == 0 else None
+            text = segment
+            if previous_codes is not None:
+                prefix = previous_codes[..., -max_prefix_frames:]
+                text = f"{_tail_words(previous_text, prefix.shape[-1] / previous_codes.shape[-1])} {segment}"
+
+            codes = generate_codes({**params, "text": text}, prefix, cancel_event)
+            codes = codes[..., 0 if prefix is None else prefix.shape[-1]:]
+            context = None if previous_codes is None else previous_codes[..., -context_frames:]
+            decoding = decoder.submit(_decode_segment, model, codes, context, active_traces())
+
+            # The previous segment was decoding while this one generated
+            if pending is not None:
+                yield pending[0], pending[1], sample_rate, pending[2].result()
+            pending = (index, segment, decoding)
+            previous_codes = codes
+            previous_text = segment
+
+        if pending is not None:
+            yield pending[0], pending[1], sample_rate, pending[2].result()
+    finally:
+        decoder.shutdown(wait=True)
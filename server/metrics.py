@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600)
+BATCH_BUCKETS = (1, 2, 4, 8, 16)
+
+def _labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = sorted(labels.items())
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple, List] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            entry = self.series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self.series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(dict(key))} {_number(value)}")
+        return lines
+
+class Gauge:
+    """Values read at scrape time from ``collect``, which returns ``(labels, value)`` pairs."""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Iterable[Tuple[dict, float]]],
+                 kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            for labels, value in self.collect():
+                if value is not None:
+                    lines.append(f"{self.name}{_labels(labels)} {_number(value)}")
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {str(e)}", file=sys.stderr)
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.caches = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, collect: Callable, kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, collect, kind))
+
+    def register_cache(self, name: str, cache):
+        """Export a cache's ``hits`` and ``misses`` attributes."""
+        with self.lock:
+            self.caches[name] = cache
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.histogram("voicepro_request_seconds", "Time to serve a command or HTTP request.")
+STAGE_SECONDS = METRICS.histogram("voicepro_stage_seconds", "Time spent in each stage of a generation.")
+GENERATED_FRAMES = METRICS.counter("voicepro_generated_frames_total", "Audio code frames generated.")
+TOKENS_PER_SECOND = METRICS.histogram(
+    "voicepro_generate_tokens_per_second", "Code frames generated per second, per generate call.", RATE_BUCKETS
+)
+BATCH_SIZE = METRICS.histogram("voicepro_batch_size", "Requests per model.generate call.", BATCH_BUCKETS)
+
+def _cache_counts(attribute: str):
+    with METRICS.lock:
+        caches = sorted(METRICS.caches.items())
+    return [({"cache": name}, getattr(cache, attribute, None)) for name, cache in caches]
+
+METRICS.gauge("voicepro_cache_hits_total", "Cache hits.", lambda: _cache_counts("hits"), kind="counter")
+METRICS.gauge("voicepro_cache_misses_total", "Cache misses.", lambda: _cache_counts("misses"), kind="counter")
+
+def _memory():
+    samples = []
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        pass
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        samples.append(({"kind": "peak_rss"}, peak if sys.platform == "darwin" else peak * 1024))
+    try:
+        with open('/proc/self/statm') as f:
+            samples.append(({"kind": "rss"}, int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')))
+    except (OSError, ValueError):
+        pass
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        samples.append(({"kind": "cuda_allocated"}, torch.cuda.memory_allocated()))
+        samples.append(({"kind": "cuda_reserved"}, torch.cuda.memory_reserved()))
+    return samples
+
+METRICS.gauge("voicepro_memory_bytes", "Process and device memory use.", _memory)
+
+class Trace:
+    """Per-request stage timings, attached to responses as ``timings``."""
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        with self.lock:
+            return {name: round(seconds, 6) for name, seconds in self.spans.items()}
+
+_local = threading.local()
+
+def active_traces() -> Tuple[Trace, ...]:
+    return getattr(_local, 'traces', ())
+
+@contextmanager
+def activate(traces: Iterable[Trace]):
+    """Record spans on this thread into ``traces``, e.g. every request in a batch."""
+    previous = active_traces()
+    _local.traces = tuple(traces)
+    try:
+        yield
+    finally:
+        _local.traces = previous
+
+class Span:
+    seconds = 0.0
+
+@contextmanager
+def span(name: str):
+    """Time a stage into the stage histogram and every active trace."""
+    timing = Span()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(timing.seconds, stage=name)
+        for trace in active_traces():
+            trace.add(name, timing.seconds)
@@ -0,0 +1,136 @@
+import os
+import sys
+import threading
+import torch
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+def estimate_model_bytes(model) -> int:
+    modules = [model]
+    # The DAC autoencoder is held outside the module tree
+    dac = getattr(getattr(model, 'autoencoder', None), 'dac', None)
+    if isinstance(dac, torch.nn.Module):
+        modules.append(dac)
+    total = 0
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+def default_memory_budget(device: str) -> Optional[int]:
+    """Memory budget for resident models from VOICEPRO_MODEL_BUDGET_MB, or a
+    share of the device's memory when unset. None means unbounded."""
+    if os.environ.get('VOICEPRO_MODEL_BUDGET_MB'):
+        return int(float(os.environ['VOICEPRO_MODEL_BUDGET_MB']) * 1024 * 1024)
+    try:
+        if device.startswith('cuda'):
+            return int(torch.cuda.get_device_properties(device).total_memory * 0.8)
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') * 0.5)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class ModelManager:
+    """Keeps several models resident within a memory budget.
+
+    Models are loaded on first use (or ahead of time with ``preload``) and
+    evicted least-recently-used first once the resident set exceeds the
+    budget. The most recently loaded model is never evicted, so a single
+    model larger than the budget still works.
+    """
+
+    def __init__(self, loader: Callable[[str], object], device: str,
+                 budget_bytes: Optional[int] = None,
+                 on_change: Optional[Callable[[dict], None]] = None):
+        self.loader = loader
+        self.device = device
+        self.budget_bytes = budget_bytes
+        self.on_change = on_change
+        self.models: OrderedDict = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+        self.loading: Dict[str, Future] = {}
+        self.errors: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def get(self, model_id: str):
+        with self.lock:
+            if model_id in self.models:
+                self.models.move_to_end(model_id)
+                return self.models[model_id]
+            pending = self.loading.get(model_id)
+            owner = pending is None
+            if owner:
+                pending = self.loading[model_id] = Future()
+                self.errors.pop(model_id, None)
+        if owner:
+            self._notify()
+            self._load(model_id, pending)
+        return pending.result()
+
+    def preload(self, model_id: str) -> threading.Thread:
+        def run():
+            try:
+                self.get(model_id)
+            except Exception as e:
+                print(f"Background preload of {model_id} failed: {str(e)}", file=sys.stderr)
+
+        thread = threading.Thread(target=run, name=f"preload-{model_id}", daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, model_id: str) -> bool:
+        with self.lock:
+            return model_id in self.models
+
+    def status(self) -> dict:
+        with self.lock:
+            models = {model_id: "loaded" for model_id in self.models}
+            models.update({model_id: "loading" for model_id in self.loading})
+            models.update({model_id: "error" for model_id in self.errors if model_id not in models})
+            return {
+                "device": self.device,
+                "models": models,
+                "errors": dict(self.errors),
+                "residentBytes": sum(self.sizes.values()),
+                "budgetBytes": self.budget_bytes,
+            }
+
+    def _load(self, model_id: str, pending: Future):
+        try:
+            print(f"Loading {model_id} model...", file=sys.stderr)
+            model = self.loader(model_id)
+            size = estimate_model_bytes(model)
+            with self.lock:
+                self.models[model_id] = model
+                self.sizes[model_id] = size
+                self.loading.pop(model_id, None)
+                evicted = self._evict_over_budget()
+            if evicted and self.device.startswith('cuda'):
+                torch.cuda.empty_cache()
+            print(f"{model_id} model loaded successfully!", file=sys.stderr)
+            pending.set_result(model)
+        except Exception as e:
+            print(f"Error loading model: {str(e)}", file=sys.stderr)
+            with self.lock:
+                self.errors[model_id] = str(e)
+                self.loading.pop(model_id, None)
+            pending.set_exception(ValueError(f"Failed to load model {model_id}: {str(e)}"))
+        self._notify()
+
+    def _evict_over_budget(self) -> list:
+        evicted = []
+        if self.budget_bytes is None:
+            return evicted
+        while len(self.models) > 1 and sum(self.sizes.values()) > self.budget_bytes:
+            model_id, _ = self.models.popitem(last=False)
+            self.sizes.pop(model_id, None)
+            evicted.append(model_id)
+            print(f"Evicted {model_id} model to stay within memory budget", file=sys.stderr)
+        return evicted
+
+    def _notify(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self.status())
+            except Exception as e:
+                print(f"Error reporting model status: {str(e)}", file=sys.stderr)
@@ -0,0 +1,92 @@
+import sys
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+class ProjectIndex:
+    """SQLite table of project metadata so listing never reads project bodies.
+
+    ``save_project`` and ``delete_project`` keep it current through ``put``
+    and ``remove``. At startup ``sync`` compares it with the project files by
+    size and mtime and re-reads only the files that changed behind its back.
+    """
+
+    def __init__(self, db_path: Path, projects_dir: Path):
+        self.projects_dir = projects_dir
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS projects (
+                name TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                modified REAL NOT NULL,
+                voice TEXT,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS projects_modified ON projects (modified DESC)")
+        self.db.commit()
+        self.sync()
+
+    def sync(self):
+        with self.lock:
+            indexed = {
+                name: (size, mtime)
+                for name, size, mtime in self.db.execute("SELECT name, size, mtime FROM projects")
+            }
+            on_disk = set()
+            for project_file in self.projects_dir.glob('*.json'):
+                name = project_file.stem
+                on_disk.add(name)
+                stat = project_file.stat()
+                if indexed.get(name) == (stat.st_size, stat.st_mtime):
+                    continue
+                try:
+                    with open(project_file) as f:
+                        data = json.load(f)
+                except ValueError as e:
+                    print(f"Skipping unreadable project {project_file}: {str(e)}", file=sys.stderr)
+                    continue
+                self._upsert(name, data, stat)
+            for name in indexed.keys() - on_disk:
+                self.db.execute("DELETE FROM projects WHERE name = ?", (name,))
+            self.db.commit()
+
+    def _upsert(self, name: str, data: dict, stat):
+        self.db.execute(
+            "INSERT OR REPLACE INTO projects (name, created, modified, voice, size, mtime) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, data.get("created", stat.st_mtime), data.get("modified", stat.st_mtime),
+             data.get("voice"), stat.st_size, stat.st_mtime)
+        )
+
+    def put(self, project_file: Path, data: dict):
+        with self.lock:
+            self._upsert(project_file.stem, data, project_file.stat())
+            self.db.commit()
+
+    def remove(self, name: str):
+        with self.lock:
+            self.db.execute("DELETE FROM projects WHERE name = ?", (name,))
+            self.db.commit()
+
+    def query(self, offset: int = 0, limit: Optional[int] = None,
+              search: Optional[str] = None) -> List[dict]:
+        """Project metadata, most recently modified first."""
+        sql = "SELECT name, created, modified, voice, size FROM projects"
+        args = []
+        if search:
+            sql += " WHERE name LIKE ? ESCAPE '\\' OR voice LIKE ? ESCAPE '\\'"
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            args += [pattern, pattern]
+        sql += " ORDER BY modified DESC LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self.lock:
+            rows = self.db.execute(sql, args).fetchall()
+        return [
+            {"name": name, "created": created, "modified": modified, "voice": voice, "size": size}
+            for name, created, modified, voice, size in rows
+        ]
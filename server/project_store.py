@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from atomic_files import write_json_atomic
+
+class ProjectStore:
+    """Project files written behind the command path.
+
+    ``save`` only records the latest body; a writer thread writes it once
+    the project has gone ``delay`` seconds without another save, or at most
+    ``max_wait`` seconds after the first unwritten one, so a burst of
+    autosaves costs one write. Reads see pending bodies, and files are
+    replaced atomically. ``delete`` moves the file into ``trash_dir``,
+    keeping the newest ``retention`` copies for ``restore``.
+    """
+
+    def __init__(self, projects_dir: Path, trash_dir: Path, delay: float = 0.5, max_wait: float = 5.0,
+                 retention: int = 50, on_write: Optional[Callable[[Path, dict], None]] = None):
+        self.projects_dir = projects_dir
+        self.trash_dir = trash_dir
+        self.delay = delay
+        self.max_wait = max(delay, max_wait)
+        self.retention = max(1, retention)
+        self.on_write = on_write
+        self.trash_dir.mkdir(exist_ok=True)
+        # name -> (body, due time, deadline) waiting for the writer
+        self.pending: Dict[str, tuple] = {}
+        self.condition = threading.Condition()
+        # Serializes file operations between the writer, flush and delete
+        self.io_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._loop, name='project-writer', daemon=True)
+        self.thread.start()
+
+    def path(self, name: str) -> Path:
+        return self.projects_dir / f"{name}.json"
+
+    def save(self, name: str, data: dict):
+        now = time.monotonic()
+        with self.condition:
+            # Steady edits keep pushing the write back, but never past the first one's deadline
+            deadline = self.pending[name][2] if name in self.pending else now + self.max_wait
+            self.pending[name] = (data, min(now + self.delay, deadline), deadline)
+            self.condition.notify()
+
+    def load(self, name: str) -> Optional[dict]:
+        with self.condition:
+            if name in self.pending:
+                return self.pending[name][0]
+        path = self.path(name)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def flush(self, name: Optional[str] = None):
+        """Write pending saves now, all of them or just ``name``'s."""
+        with self.io_lock:
+            with self.condition:
+                names = list(self.pending) if name is None else [name] if name in self.pending else []
+                due = [(n, self.pending.pop(n)[0]) for n in names]
+            for n, data in due:
+                self._write(n, data)
+
+    def delete(self, name: str) -> Optional[str]:
+        """Move the project to the trash; returns the trash entry for ``restore``, or None."""
+        with self.io_lock:
+            with self.condition:
+                pending = self.pending.pop(name, None)
+            path = self.path(name)
+            if pending is None and not path.exists():
+                return None
+            trash_name = f"{name}.{time.time_ns()}.json"
+            if pending is not None:
+                # The latest body never reached disk, so it goes straight to the trash
+                write_json_atomic(self.trash_dir / trash_name, pending[0])
+                if path.exists():
+                    path.unlink()
+            else:
+                os.replace(path, self.trash_dir / trash_name)
+        self._prune()
+        return trash_name
+
+    def restore(self, trash_name: str, name: str) -> Optional[dict]:
+        """Move a trashed project back unless one of that name exists; returns its body."""
+        trash_path = self.trash_dir / Path(trash_name).name
+        with self.io_lock:
+            with self.condition:
+                taken = name in self.pending
+            if taken or self.path(name).exists() or not trash_path.exists():
+                return None
+            with open(trash_path) as f:
+                data = json.load(f)
+            os.replace(trash_path, self.path(name))
+        return data
+
+    def close(self):
+        self.flush()
+
+    def _prune(self):
+        # Order by the deletion time in the name; a moved file keeps its last save's mtime
+        trashed = sorted(self.trash_dir.glob('*.json'), key=lambda p: int(p.stem.rsplit('.', 1)[-1]), reverse=True)
+        for path in trashed[self.retention:]:
+            path.unlink(missing_ok=True)
+
+    def _write(self, name: str, data: dict):
+        # Called with self.io_lock held
+        path = self.path(name)
+        try:
+            write_json_atomic(path, data)
+        except OSError as e:
+            print(f"Error saving project {name}, retrying: {str(e)}", file=sys.stderr)
+            with self.condition:
+                retry = time.monotonic() + self.delay
+                self.pending.setdefault(name, (data, retry, retry))
+            return
+        except Exception as e:
+            # Retrying can't help a body that doesn't serialize
+            print(f"Error saving project {name}: {str(e)}", file=sys.stderr)
+            return
+        if self.on_write is not None:
+            try:
+                self.on_write(path, data)
+            except Exception as e:
+                # The file is written; a failing index or history update mustn't stop later saves
+                print(f"Error after saving project {name}: {str(e)}", file=sys.stderr)
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                name, (_, due, _) = min(self.pending.items(), key=lambda item: item[1][1])
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    # A newer save may push the deadline back; re-check when woken
+                    self.condition.wait(remaining)
+                    continue
+            try:
+                self.flush(name)
+            except Exception as e:
+                # The writer must outlive any one save, or later edits would sit in pending forever
+                print(f"Error in project writer: {str(e)}", file=sys.stderr)
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import threading
+import wave
+import numpy as np
+import torch
+import torchaudio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from atomic_files import write_json_atomic
+from audio_transport import encode_samples
+from long_form import stream_long_audio
+from synthesis import GenerationCancelled
+
+@dataclass
+class RenderItem:
+    projectId: str
+    status: str = "pending"  # pending | done | failed
+    output: Optional[str] = None
+    error: Optional[str] = None
+    chars: int = 0
+
+@dataclass
+class RenderJob:
+    id: str
+    status: str  # queued | running | done | failed | cancelled
+    created: float
+    items: List[RenderItem] = field(default_factory=list)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def counts(self) -> Tuple[int, int]:
+        finished = sum(1 for item in self.items if item.status != "pending")
+        return finished, len(self.items)
+
+# Bit rates behind the output settings' quality choices
+QUALITY_BIT_RATES = {"low": 64_000, "medium": 128_000, "high": 192_000, "very-high": 320_000}
+
+def write_audio(path: Path, audio: np.ndarray, sample_rate: int, output_settings: dict) -> Path:
+    """Write ``audio`` in the format, quality and sample rate of ``outputSettings``.
+
+    WAV is written directly (24-bit at "high" quality and above, 16-bit
+    otherwise); other formats go through ``torchaudio.save`` at the
+    quality's bit rate. The file is written under
+    a temporary name and moved into place, so an interrupted write never
+    leaves a file that looks finished.
+    """
+    audio_format = str(output_settings.get("format", "wav")).lower()
+    target_rate = int(output_settings.get("sampleRate") or sample_rate)
+    if target_rate != sample_rate:
+        resampled = torchaudio.functional.resample(torch.from_numpy(audio), sample_rate, target_rate)
+        audio, sample_rate = resampled.numpy(), target_rate
+
+    # Appended rather than swapped in, so dots in project names survive
+    path = path.with_name(f"{path.name}.{audio_format}")
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if audio_format == "wav":
+        with wave.open(str(tmp_path), 'wb') as writer:
+            writer.setnchannels(1)
+            writer.setframerate(sample_rate)
+            if output_settings.get("quality") in ("high", "very-high"):
+                samples = (np.clip(audio, -1.0, 1.0) * 8388607).astype('<i4')
+                writer.setsampwidth(3)
+                writer.writeframes(samples.view(np.uint8).reshape(-1, 4)[:, :3].tobytes())
+            else:
+                writer.setsampwidth(2)
+                writer.writeframes(encode_samples(audio, 'int16'))
+    else:
+        bit_rate = QUALITY_BIT_RATES.get(output_settings.get("quality"), QUALITY_BIT_RATES["high"])
+        torchaudio.save(str(tmp_path), torch.from_numpy(audio).unsqueeze(0), sample_rate,
+                        format=audio_format, compression=bit_rate)
+    os.replace(tmp_path, path)
+    return path
+
+class RenderQueue:
+    """Renders whole projects to audio files in the background.
+
+    Jobs are processed one at a time on a render thread that feeds the
+    inference scheduler, while encoding and writing each finished project
+    runs on a small thread pool so the model never waits on the disk. Job
+    state is saved to ``jobs_dir`` after every project; jobs that were still
+    queued or running when the server stopped resume from the first
+    unfinished project on the next start. Progress is reported through
+    ``emit`` as ``render-progress`` events.
+    """
+
+    def __init__(self, jobs_dir: Path, output_dir: Path,
+                 load_project: Callable[[str], Tuple[dict, dict]],
+                 emit: Callable, encode_workers: int = 2):
+        self.jobs_dir = jobs_dir
+        self.output_dir = output_dir
+        self.load_project = load_project
+        self.emit = emit
+        self.jobs: Dict[str, RenderJob] = {}
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+        self.queue: "queue.Queue[str]" = queue.Queue()
+        self.encoder = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix='render-encode')
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self._loop, name='render', daemon=True)
+        self.thread.start()
+
+    def resume(self):
+        for job_file in sorted(self.jobs_dir.glob('*.json')):
+            try:
+                with open(job_file) as f:
+                    data = json.load(f)
+                data["items"] = [RenderItem(**item) for item in data["items"]]
+                job = RenderJob(**data)
+            except Exception as e:
+                print(f"Skipping unreadable render job {job_file}: {str(e)}", file=sys.stderr)
+                continue
+            with self.lock:
+                self.jobs[job.id] = job
+            if job.status in ("queued", "running"):
+                print(f"Resuming render job {job.id}", file=sys.stderr)
+                self._enqueue(job)
+
+    def submit(self, project_ids: List[str]) -> dict:
+        if not project_ids:
+            raise ValueError("At least one project is required")
+        job = RenderJob(
+            id=uuid.uuid4().hex,
+            status="queued",
+            created=time.time(),
+            items=[RenderItem(projectId=project_id) for project_id in project_ids]
+        )
+        with self.lock:
+            self.jobs[job.id] = job
+            self._save(job)
+        self._enqueue(job)
+        return asdict(job)
+
+    def cancel(self, job_id: str) -> bool:
+        with self.lock:
+            cancel_event = self.cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def status(self, job_id: Optional[str] = None):
+        with self.lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return asdict(job) if job else None
+            return [asdict(job) for job in sorted(self.jobs.values(), key=lambda j: j.created, reverse=True)]
+
+    def _enqueue(self, job: RenderJob):
+        with self.lock:
+            self.cancel_events[job.id] = threading.Event()
+        self.queue.put(job.id)
+
+    def _save(self, job: RenderJob):
+        # Called with self.lock held
+        path = self.jobs_dir / f"{job.id}.json"
+        write_json_atomic(path, asdict(job))
+
+    def _progress(self, job: RenderJob, chars_done: int, chars_total: int, project_id: Optional[str] = None):
+        elapsed = time.time() - job.started
+        eta = None
+        if 0 < chars_done < chars_total:
+            eta = elapsed * (chars_total - chars_done) / chars_done
+        finished, total = job.counts()
+        self.emit({"event": "render-progress", "data": {
+            "jobId": job.id,
+            "status": job.status,
+            "projectId": project_id,
+            "completed": finished,
+            "total": total,
+            "progress": chars_done / chars_total if chars_total else 1.0,
+            "elapsed": elapsed,
+            "eta": eta,
+        }})
+
+    def _loop(self):
+        while True:
+            job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs[job_id]
+                cancel_event = self.cancel_events[job_id]
+            try:
+                self._run(job, cancel_event)
+            except Exception as e:
+                print(f"Render job {job.id} failed: {str(e)}", file=sys.stderr)
+                with self.lock:
+                    job.status = "failed"
+                    self._save(job)
+            finally:
+                with self.lock:
+                    self.cancel_events.pop(job_id, None)
+                self._progress(job, 1, 1)
+
+    def _run(self, job: RenderJob, cancel_event: threading.Event):
+        with self.lock:
+            job.status = "running"
+            job.started = time.time()
+            self._save(job)
+
+        # Load every remaining project up front so progress is measured in characters of script
+        pending = []
+        for item in job.items:
+            if item.status != "pending":
+                continue
+            try:
+                params, output_settings = self.load_project(item.projectId)
+            except Exception as e:
+                self._finish_item(job, item, error=e)
+                continue
+            item.chars = len(params.get("text", ""))
+            pending.append((item, params, output_settings))
+        chars_total = sum(item.chars for item, _, _ in pending)
+        chars_done = 0
+
+        writes = []
+        for item, params, output_settings in pending:
+            if cancel_event.is_set():
+                break
+            try:
+                audio = []
+                sample_rate = None
+                for _, text, sample_rate, segment in stream_long_audio(params, cancel_event=cancel_event):
+                    audio.append(segment)
+                    chars_done += len(text)
+                    self._progress(job, chars_done, chars_total, item.projectId)
+            except GenerationCancelled:
+                break
+            except Exception as e:
+                self._finish_item(job, item, error=e)
+                continue
+            audio = np.concatenate(audio) if audio else np.zeros(0, dtype='float32')
+            writes.append(self.encoder.submit(
+                self._write, job, item, audio, sample_rate, output_settings
+            ))
+
+        for write in writes:
+            write.result()
+        with self.lock:
+            if cancel_event.is_set():
+                job.status = "cancelled"
+            else:
+                job.status = "failed" if any(item.status == "failed" for item in job.items) else "done"
+            job.finished = time.time()
+            self._save(job)
+
+    def _write(self, job: RenderJob, item: RenderItem, audio: np.ndarray, sample_rate: int,
+               output_settings: dict):
+        try:
+            path = write_audio(self.output_dir / item.projectId, audio, sample_rate, output_settings)
+        except Exception as e:
+            self._finish_item(job, item, error=e)
+        else:
+            self._finish_item(job, item, output=str(path))
+
+    def _finish_item(self, job: RenderJob, item: RenderItem, output: Optional[str] = None,
+                     error: Optional[Exception] = None):
+        with self.lock:
+            if error is not None:
+                print(f"Failed to render project {item.projectId}: {str(error)}", file=sys.stderr)
+                item.status = "failed"
+                item.error = str(error)
+            else:
+                item.status = "done"
+                item.output = output
+            self._save(job)
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+from atomic_files import atomic_write
+from tensor_cache import CACHE_DIR, file_digest
+from synthesis import CONDITIONING_SCALARS, MODEL_VARIANT, prefix_source, resolve_audio_path, sampling_params_from
+
+# Every generate-audio parameter that changes the output, with the defaults synthesis applies
+CONDITIONING_DEFAULTS = {"language": "en-us", **CONDITIONING_SCALARS, "cfg_scale": 2.0}
+
+def result_key(params: dict) -> Optional[str]:
+    """Canonical hash of everything that determines a generated clip.
+
+    Returns None when the request is not reproducible (randomized seed), as
+    caching it would just replay one arbitrary take.
+    """
+    if params.get("randomize_seed"):
+        return None
+    unconditional_keys = sorted(params.get("unconditional_keys", ["emotion"]))
+    speaker = None
+    if params.get("speaker_audio") and "speaker" not in unconditional_keys:
+        speaker = file_digest(resolve_audio_path(params["speaker_audio"]))
+    prefix = prefix_source(params)
+
+    canonical = {
+        "model": params.get("model_choice"),
+        "text": params.get("text", ""),
+        "speaker": speaker,
+        "prefix": prefix[1] if prefix else None,
+        "unconditional_keys": unconditional_keys,
+        "sampling": sampling_params_from(params),
+        "seed": params.get("seed"),
+    }
+    # Full-precision keys predate variants, so only others are tagged
+    if MODEL_VARIANT != "full":
+        canonical["variant"] = MODEL_VARIANT
+    for name, default in CONDITIONING_DEFAULTS.items():
+        value = params.get(name, default)
+        canonical[name] = value if isinstance(value, str) else float(value)
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """Finished waveforms on disk, evicted least-recently-used past ``max_bytes``."""
+
+    def __init__(self, root: Path = CACHE_DIR / 'results', max_bytes: int = 1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Rebuild the LRU order from access times left by earlier runs
+        files = [f for f in self.root.glob('*.npz') if '.tmp' not in f.name]
+        for f in sorted(files, key=lambda f: f.stat().st_mtime):
+            self.entries[f.stem] = f.stat().st_size
+            self.total_bytes += self.entries[f.stem]
+
+    def get(self, key: str) -> Optional[Tuple[int, np.ndarray]]:
+        path = self.root / f"{key}.npz"
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with np.load(path) as data:
+                result = int(data["sample_rate"]), data["audio"]
+            os.utime(path)
+        except Exception as e:
+            print(f"Discarding unreadable cached result {path}: {str(e)}", file=sys.stderr)
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.misses += 1
+            path.unlink(missing_ok=True)
+            return None
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, sample_rate: int, audio: np.ndarray):
+        path = self.root / f"{key}.npz"
+        with atomic_write(path, 'wb') as f:
+            np.savez(f, sample_rate=np.int64(sample_rate), audio=audio.astype('float32'))
+        with self.lock:
+            self.total_bytes += path.stat().st_size - self.entries.pop(key, 0)
+            self.entries[key] = path.stat().st_size
+            while len(self.entries) > 1 and self.total_bytes > self.max_bytes:
+                evicted, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                (self.root / f"{evicted}.npz").unlink(missing_ok=True)
@@ -0,0 +1,77 @@
+import random
+import threading
+import torch
+from contextlib import contextmanager
+from typing import List
+
+try:
+    import zonos.sampling as zonos_sampling
+except ImportError:
+    zonos_sampling = None
+
+# Matches the range get_voice_settings advertises
+SEED_MAX = 1_000_000
+
+_multinomial = getattr(zonos_sampling, "multinomial", None)
+_masked_scatter_ = torch.Tensor.masked_scatter_
+_local = threading.local()
+
+def resolve_seed(params: dict) -> dict:
+    """Return ``params`` with a concrete seed, drawing one if it is randomized or missing."""
+    seed = params.get("seed")
+    if params.get("randomize_seed") or seed is None:
+        seed = random.randint(0, SEED_MAX)
+    return {**params, "seed": int(seed), "randomize_seed": False}
+
+def row_multinomial(input: torch.Tensor, num_samples: int, replacement: bool = False, *, generator=None):
+    """Drop-in for ``zonos.sampling.multinomial`` that draws each batch row from its own generator.
+
+    Sampling is the argmax of probabilities over exponential noise, which is
+    an exact categorical draw; giving every row its own stream makes a
+    request's output independent of what it was batched with, as long as
+    the rows' conditionings need no padding (``generate_batch`` only
+    batches equal lengths).
+    """
+    generators = getattr(_local, 'generators', None)
+    if generator is not None or num_samples != 1 or not generators or input.shape[0] != len(generators):
+        return _multinomial(input, num_samples, replacement=replacement, generator=generator)
+    noise = torch.empty_like(input)
+    for row, row_generator in enumerate(generators):
+        noise[row].exponential_(1, generator=row_generator)
+    return torch.argmax(input / noise, dim=-1, keepdim=True).to(torch.int64)
+
+def row_masked_scatter_(self: torch.Tensor, mask: torch.Tensor, source: torch.Tensor) -> torch.Tensor:
+    """``Tensor.masked_scatter_`` that fills each masked slot from the same slot of ``source``.
+
+    Zonos writes each step's tokens into the frame's unknown codebooks with
+    ``masked_scatter_``, which reads ``source`` in flattened order. The delay
+    pattern leaves only some codebooks unknown in the first and last frames
+    (a prefix, then a suffix at the frame cap), so in a batch a row would
+    take its neighbour's tokens. While per-row seeds are active on this
+    thread, a frame-shaped scatter copies slot for slot instead.
+    """
+    generators = getattr(_local, 'generators', None)
+    if (generators and self.dim() == 3 and self.shape[0] == len(generators)
+            and mask.shape == self.shape and source.shape == self.shape):
+        return self.copy_(torch.where(mask, source, self))
+    return _masked_scatter_(self, mask, source)
+
+def install_seeded_sampling() -> bool:
+    """Route Zonos sampling through per-row generators and row-aligned frame writes; False if Zonos has no hook for it."""
+    if _multinomial is None:
+        return False
+    zonos_sampling.multinomial = row_multinomial
+    torch.Tensor.masked_scatter_ = row_masked_scatter_
+    return True
+
+@contextmanager
+def row_seeds(seeds: List[int], device):
+    """Seed generation on this thread, one generator per batch row."""
+    # Also seeds the global generator, for sampling outside the per-row hook
+    torch.manual_seed(seeds[0])
+    previous = getattr(_local, 'generators', None)
+    _local.generators = [torch.Generator(device=device).manual_seed(seed) for seed in seeds]
+    try:
+        yield
+    finally:
+        _local.generators = previous
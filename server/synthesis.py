@@ -0,0 +1,603 @@
+import os
+import sys
+import json
+import queue
+import threading
+import torch
+import torchaudio
+import numpy as np
+from concurrent.futures import Future
+from typing import Optional
+from zonos.model import Zonos
+from zonos.conditioning import make_cond_dict
+from atomic_files import write_json_atomic
+from tensor_cache import CACHE_DIR, TensorCache, file_digest
+from model_manager import ModelManager, default_memory_budget
+from batching import InferenceScheduler
+from conditioning_cache import PHONEME_CACHE_STATS, ConditioningCache, install_phoneme_cache
+from cpu_inference import (
+    QUANTIZE, SHARED_WEIGHTS, TORCH_COMPILE, configure_threads, generate_options, load_shared, model_variant,
+    quantize_backbone, warm_up
+)
+from seeding import SEED_MAX, install_seeded_sampling, resolve_seed, row_seeds
+from metrics import BATCH_SIZE, GENERATED_FRAMES, METRICS, TOKENS_PER_SECOND, span
+
+# Global variables
+DEFAULT_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+SAMPLES_PATH = os.environ.get('SAMPLES_PATH', '')
+MODEL_VARIANT = model_variant(DEFAULT_DEVICE)
+
+if DEFAULT_DEVICE == 'cpu':
+    configure_threads()
+
+# The autoencoder runs at roughly 86 code frames per second of audio
+FRAME_RATE = 86
+MAX_NEW_TOKENS = FRAME_RATE * 30
+NUM_CODEBOOKS = 9
+
+# Speaker embeddings keyed by model and reference audio contents, kept across restarts
+SPEAKER_CACHE = TensorCache('speakers', capacity=int(os.environ.get('VOICEPRO_SPEAKER_CACHE_SIZE', 32)))
+
+# Encoded prefix audio keyed by model and file contents, kept across restarts
+PREFIX_CACHE = TensorCache('prefixes', capacity=int(os.environ.get('VOICEPRO_PREFIX_CACHE_SIZE', 16)))
+
+# Named prefixes registered with register_prefix, usable as params["prefix_id"]
+PREFIX_REGISTRY_PATH = CACHE_DIR / 'prefixes' / 'registry.json'
+PREFIX_LOCK = threading.Lock()
+
+# Prepared prefix conditioning, so changing only the seed or sampling skips the text front-end
+CONDITIONING_CACHE = ConditioningCache(capacity=int(os.environ.get('VOICEPRO_CONDITIONING_CACHE_SIZE', 32)))
+install_phoneme_cache()
+# Each batch row samples from its own seeded generator; without the hook seeded requests run alone
+PER_ROW_SEEDS = install_seeded_sampling()
+METRICS.register_cache("speakers", SPEAKER_CACHE)
+METRICS.register_cache("prefixes", PREFIX_CACHE)
+METRICS.register_cache("conditioning", CONDITIONING_CACHE)
+METRICS.register_cache("phonemes", PHONEME_CACHE_STATS)
+
+# Scalar conditioning parameters and the defaults make_conditioning_dict applies
+CONDITIONING_SCALARS = {
+    "e1": 1.0, "e2": 0.05, "e3": 0.05, "e4": 0.05,
+    "e5": 0.05, "e6": 0.05, "e7": 0.1, "e8": 0.2,
+    "vq_single": 0.78,
+    "fmax": 24000,
+    "pitch_std": 45.0,
+    "speaking_rate": 15.0,
+    "dnsmos_ovrl": 4.0,
+    "speaker_noised": False,
+}
+
+class GenerationCancelled(Exception):
+    pass
+
+def load_pretrained(model_choice: str):
+    model = Zonos.from_pretrained(model_choice, device=DEFAULT_DEVICE)
+    return model.requires_grad_(False).eval()
+
+def load_zonos(model_choice: str):
+    if DEFAULT_DEVICE == 'cpu' and SHARED_WEIGHTS:
+        model = load_shared(model_choice, load_pretrained)
+    else:
+        model = load_pretrained(model_choice)
+    if DEFAULT_DEVICE == 'cpu':
+        if QUANTIZE and not SHARED_WEIGHTS:
+            quantize_backbone(model, model_choice)
+        if TORCH_COMPILE:
+            cond_dict = make_cond_dict(text="Warming up.", language="en-us")
+            warm_up(model, model.prepare_conditioning(cond_dict))
+    return model
+
+# Resident models, evicted least-recently-used once they exceed the memory budget
+MODEL_MANAGER = ModelManager(load_zonos, DEFAULT_DEVICE, default_memory_budget(DEFAULT_DEVICE))
+
+def load_model_if_needed(model_choice: str):
+    with span("load"):
+        return MODEL_MANAGER.get(model_choice)
+
+def resolve_audio_path(audio_path: str) -> str:
+    if audio_path.startswith('/samples/'):
+        return os.path.join(SAMPLES_PATH, os.path.basename(audio_path))
+    return audio_path
+
+def get_speaker_embedding(model, params: dict):
+    if not params.get("speaker_audio") or "speaker" in params.get("unconditional_keys", []):
+        return None
+    try:
+        audio_path = resolve_audio_path(params["speaker_audio"])
+        digest = file_digest(audio_path)
+
+        def compute():
+            print("Computing speaker embedding", file=sys.stderr)
+            wav, sr = torchaudio.load(audio_path)
+            return model.make_speaker_embedding(wav, sr).to(DEFAULT_DEVICE, torch.bfloat16)
+
+        with span("embedding"):
+            return SPEAKER_CACHE.get_or_compute(params["model_choice"], digest, compute, DEFAULT_DEVICE)
+    except Exception as e:
+        print(f"Error processing reference audio: {str(e)}", file=sys.stderr)
+        raise ValueError(f"Failed to process reference audio: {str(e)}")
+
+def load_prefix_registry() -> dict:
+    if PREFIX_REGISTRY_PATH.exists():
+        with open(PREFIX_REGISTRY_PATH) as f:
+            return json.load(f)
+    return {}
+
+def register_prefix(name: str, audio_path: str, model_choice: Optional[str] = None) -> dict:
+    """Register prefix audio under ``name`` and encode it for ``model_choice`` up front."""
+    if not name:
+        raise ValueError("Prefix name is required")
+    path = resolve_audio_path(audio_path)
+    entry = {"name": name, "path": path, "digest": file_digest(path)}
+    if model_choice:
+        model = load_model_if_needed(model_choice)
+        params = {"model_choice": model_choice, "prefix_audio": path}
+        SCHEDULER.call(encode_prefix_audio, model, params).result()
+    with PREFIX_LOCK:
+        registry = load_prefix_registry()
+        registry[name] = entry
+        PREFIX_REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(PREFIX_REGISTRY_PATH, registry)
+    return entry
+
+def prefix_source(params: dict):
+    """``(path, digest)`` of the request's prefix audio, or None without one."""
+    if params.get("prefix_id"):
+        with PREFIX_LOCK:
+            entry = load_prefix_registry().get(params["prefix_id"])
+        if entry is None:
+            raise ValueError(f"Unknown prefix {params['prefix_id']}")
+        return entry["path"], entry["digest"]
+    if params.get("prefix_audio"):
+        return params["prefix_audio"], file_digest(params["prefix_audio"])
+    return None
+
+def encode_prefix_audio(model, params: dict):
+    try:
+        source = prefix_source(params)
+        if source is None:
+            return None
+        path, digest = source
+
+        def compute():
+            print("Encoding prefix audio", file=sys.stderr)
+            wav_prefix, sr_prefix = torchaudio.load(path)
+            wav_prefix = wav_prefix.mean(0, keepdim=True)
+            wav_prefix = model.autoencoder.preprocess(wav_prefix, sr_prefix)
+            wav_prefix = wav_prefix.to(DEFAULT_DEVICE, torch.float32)
+            return model.autoencoder.encode(wav_prefix.unsqueeze(0))
+
+        with span("prefix"):
+            return PREFIX_CACHE.get_or_compute(params["model_choice"], digest, compute, DEFAULT_DEVICE)
+    except Exception as e:
+        print(f"Error processing prefix audio: {str(e)}", file=sys.stderr)
+        raise ValueError(f"Failed to process prefix audio: {str(e)}")
+
+def make_conditioning_dict(params: dict, speaker_embedding) -> dict:
+    # Create emotion tensor
+    emotion_tensor = torch.tensor([
+        float(params.get("e1", 1.0)),  # Happiness
+        float(params.get("e2", 0.05)),  # Sadness
+        float(params.get("e3", 0.05)),  # Disgust
+        float(params.get("e4", 0.05)),  # Fear
+        float(params.get("e5", 0.05)),  # Surprise
+        float(params.get("e6", 0.05)),  # Anger
+        float(params.get("e7", 0.1)),   # Other
+        float(params.get("e8", 0.2)),   # Neutral
+    ], device=DEFAULT_DEVICE)
+
+    # Create VQ score tensor
+    vq_val = float(params.get("vq_single", 0.78))
+    vq_tensor = torch.tensor([vq_val] * 8, device=DEFAULT_DEVICE).unsqueeze(0)
+
+    # Create conditioning dictionary
+    return make_cond_dict(
+        text=params.get("text", ""),
+        language=params.get("language", "en-us"),
+        speaker=speaker_embedding,
+        emotion=emotion_tensor,
+        vqscore_8=vq_tensor,
+        fmax=float(params.get("fmax", 24000)),
+        pitch_std=float(params.get("pitch_std", 45.0)),
+        speaking_rate=float(params.get("speaking_rate", 15.0)),
+        dnsmos_ovrl=float(params.get("dnsmos_ovrl", 4.0)),
+        speaker_noised=bool(params.get("speaker_noised", False)),
+        device=DEFAULT_DEVICE,
+        unconditional_keys=params.get("unconditional_keys", ["emotion"]),
+    )
+
+def conditioning_key(params: dict):
+    unconditional_keys = tuple(sorted(params.get("unconditional_keys", ["emotion"])))
+    speaker = None
+    if params.get("speaker_audio") and "speaker" not in unconditional_keys:
+        speaker = file_digest(resolve_audio_path(params["speaker_audio"]))
+    return (
+        params.get("model_choice"),
+        params.get("text", ""),
+        params.get("language", "en-us"),
+        speaker,
+        tuple(float(params.get(name, default)) for name, default in CONDITIONING_SCALARS.items()),
+        unconditional_keys,
+    )
+
+def make_conditioning(model, params: dict, speaker_embedding):
+    with span("conditioning"):
+        return CONDITIONING_CACHE.get_or_compute(
+            conditioning_key(params),
+            lambda: model.prepare_conditioning(make_conditioning_dict(params, speaker_embedding))
+        )
+
+def record_generation(frames: int, seconds: float, batch_size: int = 1):
+    GENERATED_FRAMES.inc(frames * batch_size)
+    BATCH_SIZE.observe(batch_size)
+    if seconds > 0:
+        TOKENS_PER_SECOND.observe(frames * batch_size / seconds)
+
+def stack_conditioning(conditionings: list) -> torch.Tensor:
+    """Batch equal-length per-request ``[cond; uncond]`` conditionings into ``[cond_B; uncond_B]``."""
+    return torch.cat([c[:1] for c in conditionings] + [c[1:] for c in conditionings])
+
+def sampling_params_from(params: dict) -> dict:
+    return {
+        "top_p": float(params.get("top_p", 0.8)),
+        "top_k": int(params.get("top_k", 50)),
+        "min_p": float(params.get("min_p", 0.05)),
+        "linear": float(params.get("linear", 0.5)),
+        "conf": float(params.get("confidence", 0.4)),
+        "quad": float(params.get("quadratic", 0.0))
+    }
+
+def to_audio_array(wav_out: torch.Tensor) -> np.ndarray:
+    # Convert to float32 numpy array and validate
+    audio_data = wav_out.reshape(-1).cpu().detach().float().numpy().astype('float32')
+    if not np.all(np.isfinite(audio_data)):
+        raise ValueError("Generated audio contains invalid values")
+    return audio_data
+
+def batch_key(params: dict):
+    """Requests with equal keys can share one batched ``model.generate`` call."""
+    if params.get("prefix_audio") or params.get("prefix_id"):
+        # Prefix codes differ in length per request, so these always run alone
+        return None
+    if not PER_ROW_SEEDS:
+        return None
+    unconditional_keys = params.get("unconditional_keys", ["emotion"])
+    has_speaker = bool(params.get("speaker_audio")) and "speaker" not in unconditional_keys
+    return (
+        params.get("model_choice"),
+        float(params.get("cfg_scale", 2.0)),
+        tuple(sorted(sampling_params_from(params).items())),
+        tuple(sorted(unconditional_keys)),
+        has_speaker,
+    )
+
+def generate_batch(params_list: list, cancel_events: Optional[list] = None) -> list:
+    """Generate several compatible requests, one ``model.generate`` call per conditioning length.
+
+    Returns one ``(sample_rate, audio)`` tuple or exception per request.
+    """
+    cancel_events = cancel_events or [None] * len(params_list)
+    results = [None] * len(params_list)
+    if not params_list[0].get("model_choice"):
+        return [ValueError("Model choice is required")] * len(params_list)
+
+    # Load and verify model
+    model = load_model_if_needed(params_list[0]["model_choice"])
+    if not model:
+        raise ValueError("Failed to load model")
+
+    # Padding a shorter conditioning would change that request's output, so
+    # only requests whose conditionings have the same length share a call
+    groups = {}
+    conditionings = {}
+    for i, params in enumerate(params_list):
+        try:
+            conditionings[i] = make_conditioning(model, params, get_speaker_embedding(model, params))
+            groups.setdefault(conditionings[i].shape[1], []).append(i)
+        except Exception as e:
+            results[i] = e
+    for active in groups.values():
+        generate_rows(model, params_list, active, [conditionings[i] for i in active], cancel_events, results)
+    return results
+
+def generate_rows(model, params_list: list, active: list, conditionings: list,
+                  cancel_events: list, results: list):
+    """Generate ``params_list[i]`` for each ``i`` in ``active`` in one call, filling ``results``."""
+    params = params_list[active[0]]
+    events = [cancel_events[i] for i in active]
+    seeds = [resolve_seed(params_list[i])["seed"] for i in active]
+    audio_prefix_codes = None
+    try:
+        # Only variant takes of one line reach here with a prefix; it applies to every row
+        if len({prefix_source(params_list[i]) for i in active}) == 1:
+            audio_prefix_codes = encode_prefix_audio(model, params)
+    except Exception as e:
+        for i in active:
+            results[i] = e
+        return
+    if audio_prefix_codes is not None:
+        audio_prefix_codes = audio_prefix_codes.expand(len(active), -1, -1)
+
+    eos_token_id = getattr(model, "eos_token_id", 1024)
+    eos_at = {}
+
+    def on_frame(frame, step, max_steps):
+        # Remember where each row emitted EOS so shorter clips can be trimmed
+        _, position = delayed_buffer(frame)
+        # At the token limit the last callback gets an empty frame past the buffer's end
+        rows = (frame[:, 0, 0] == eos_token_id).nonzero().flatten().tolist() if frame.numel() else []
+        for row in rows:
+            eos_at.setdefault(row, position - 1)
+        return not all(e is not None and e.is_set() for e in events)
+
+    try:
+        with span("conditioning"):
+            conditioning = stack_conditioning(conditionings)
+
+        # Generate audio
+        with span("generate") as timing, row_seeds(seeds, DEFAULT_DEVICE):
+            codes = model.generate(
+                prefix_conditioning=conditioning,
+                audio_prefix_codes=audio_prefix_codes,
+                max_new_tokens=MAX_NEW_TOKENS,
+                cfg_scale=float(params.get("cfg_scale", 2.0)),
+                batch_size=len(active),
+                sampling_params=sampling_params_from(params),
+                callback=on_frame,
+                **generate_options(model, DEFAULT_DEVICE),
+            )
+        prefix_frames = 0 if audio_prefix_codes is None else audio_prefix_codes.shape[-1]
+        record_generation(codes.shape[-1] - prefix_frames, timing.seconds, len(active))
+
+        # Decode to waveform
+        with span("decode"):
+            wav_out = model.autoencoder.decode(codes)
+        samples_per_frame = wav_out.shape[-1] // codes.shape[-1]
+        sample_rate = int(model.autoencoder.sampling_rate)
+        for row, i in enumerate(active):
+            if events[row] is not None and events[row].is_set():
+                results[i] = GenerationCancelled("Cancelled")
+                continue
+            frames = min(eos_at.get(row, codes.shape[-1]), codes.shape[-1])
+            try:
+                results[i] = (sample_rate, to_audio_array(wav_out[row, :, :frames * samples_per_frame]))
+            except Exception as e:
+                results[i] = e
+
+    except Exception as e:
+        print(f"Error during audio generation: {str(e)}", file=sys.stderr)
+        error = ValueError(f"Failed to generate audio: {str(e)}")
+        for i in active:
+            results[i] = error
+
+# Variant takes may override these; anything else would need its own conditioning
+VARIANT_KEYS = {"seed", "cfg_scale", "top_p", "top_k", "min_p", "linear", "confidence", "quadratic"}
+MAX_VARIANTS = int(os.environ.get('VOICEPRO_MAX_VARIANTS', 8))
+
+# Runs every model.generate call, batching compatible generate-audio requests
+SCHEDULER = InferenceScheduler(
+    generate_batch,
+    max_batch_size=int(os.environ.get('VOICEPRO_MAX_BATCH_SIZE', 4)),
+    window=float(os.environ.get('VOICEPRO_BATCH_WINDOW_MS', 20)) / 1000,
+    on_cancel=lambda: GenerationCancelled("Cancelled"),
+)
+METRICS.gauge("voicepro_queue_depth", "Requests waiting for the inference worker.",
+              lambda: [({}, SCHEDULER.pending())])
+
+def submit_audio(params: dict, cancel_event: Optional[threading.Event] = None) -> Future:
+    """Queue a generation; the future resolves to ``(sample_rate, audio)``.
+
+    Resolve a randomized seed with ``resolve_seed`` first to learn which one is used.
+    """
+    if not params.get("model_choice"):
+        raise ValueError("Model choice is required")
+    params = resolve_seed(params)
+    return SCHEDULER.submit(batch_key(params), params, cancel_event)
+
+def generate_audio(params: dict, cancel_event: Optional[threading.Event] = None):
+    return submit_audio(params, cancel_event).result()
+
+def generate_variants(params: dict, variants: Optional[list] = None, count: int = 4,
+                      cancel_event: Optional[threading.Event] = None) -> list:
+    """Generate several takes of one line, batched into as few ``model.generate`` calls as possible.
+
+    Take ``i`` is ``params`` with seed ``seed + i`` and then ``variants[i]``
+    applied; overrides are limited to ``VARIANT_KEYS`` so every take shares
+    the prepared conditioning and speaker embedding. Takes with the same
+    sampling settings run as one batch. Returns ``(take_params, result)``
+    per take, where result is ``(sample_rate, audio)`` or an exception.
+    """
+    if not params.get("model_choice"):
+        raise ValueError("Model choice is required")
+    variants = variants if variants else [{}] * count
+    if len(variants) > MAX_VARIANTS:
+        raise ValueError(f"At most {MAX_VARIANTS} variants can be generated at once")
+    base = resolve_seed(params)
+    takes = []
+    for i, overrides in enumerate(variants):
+        unknown = set(overrides) - VARIANT_KEYS
+        if unknown:
+            raise ValueError(f"Variants can't override {', '.join(sorted(unknown))}")
+        takes.append({**base, "seed": (base["seed"] + i) % (SEED_MAX + 1), **overrides})
+
+    groups = {}
+    for i, take in enumerate(takes):
+        # Without per-row generators a take's output would depend on its batch, so each runs alone
+        key = (float(take.get("cfg_scale", 2.0)), tuple(sorted(sampling_params_from(take).items())))
+        groups.setdefault(key if PER_ROW_SEEDS else i, []).append(i)
+    pending = [(indices, SCHEDULER.call(generate_batch, [takes[i] for i in indices],
+                                        [cancel_event] * len(indices)))
+               for indices in groups.values()]
+    results = [None] * len(takes)
+    for indices, future in pending:
+        for i, result in zip(indices, future.result()):
+            results[i] = result
+    return list(zip(takes, results))
+
+def generate_codes(params: dict, audio_prefix_codes=None,
+                   cancel_event: Optional[threading.Event] = None) -> torch.Tensor:
+    """Generate codes for one request on the scheduler thread without decoding.
+
+    The returned codes start with ``audio_prefix_codes`` when one is given.
+    """
+    model = load_model_if_needed(params["model_choice"])
+    seed = resolve_seed(params)["seed"]
+
+    def run():
+        conditioning = make_conditioning(model, params, get_speaker_embedding(model, params))
+        with span("generate") as timing, row_seeds([seed], DEFAULT_DEVICE):
+            codes = model.generate(
+                prefix_conditioning=conditioning,
+                audio_prefix_codes=audio_prefix_codes,
+                max_new_tokens=MAX_NEW_TOKENS,
+                cfg_scale=float(params.get("cfg_scale", 2.0)),
+                batch_size=1,
+                sampling_params=sampling_params_from(params),
+                progress_bar=False,
+                callback=None if cancel_event is None else lambda *_: not cancel_event.is_set(),
+                **generate_options(model, DEFAULT_DEVICE),
+            )
+        prefix_frames = 0 if audio_prefix_codes is None else audio_prefix_codes.shape[-1]
+        record_generation(codes.shape[-1] - prefix_frames, timing.seconds)
+        return codes
+
+    try:
+        codes = SCHEDULER.call(run).result()
+    except Exception as e:
+        print(f"Error during audio generation: {str(e)}", file=sys.stderr)
+        raise ValueError(f"Failed to generate audio: {str(e)}")
+    if cancel_event is not None and cancel_event.is_set():
+        raise GenerationCancelled("Cancelled")
+    return codes
+
+def delayed_buffer(frame: torch.Tensor):
+    """The delay-patterned buffer a ``generate`` callback frame is a view of,
+    and the frame's position in it.
+
+    ``model.generate`` runs under inference mode, where views don't keep
+    ``_base``, so the buffer is rebuilt from the frame's storage. It is the
+    contiguous ``(batch, codebooks, length)`` tensor from the delay pattern.
+    """
+    batch, codebooks, _ = frame.shape
+    buffer = frame.as_strided((batch, codebooks, frame.stride(1)), frame.stride(), 0)
+    return buffer, frame.storage_offset()
+
+def revert_delays(delayed: torch.Tensor, start: int, end: int) -> torch.Tensor:
+    """Read time steps ``[start, end)`` out of a delay-patterned code buffer.
+
+    Codebook ``k`` of time step ``t`` lives at position ``t + k + 1`` of the
+    buffer ``model.generate`` fills in.
+    """
+    codes = torch.stack(
+        [delayed[:, k, start + k + 1:end + k + 1] for k in range(NUM_CODEBOOKS)], dim=1
+    )
+    # EOS and masked tokens are not valid autoencoder codes
+    return codes.masked_fill(codes >= 1024, 0)
+
+def stream_audio(params: dict, chunk_seconds: float = 1.0, context_frames: int = 8,
+                 cancel_event: Optional[threading.Event] = None):
+    """Generate audio and yield ``(sample_rate, chunk)`` pairs as it is produced.
+
+    Generation runs on the inference scheduler's thread and reports each
+    sampled frame to this generator, which decodes overlapping windows of codes so the first
+    chunk is ready after about ``chunk_seconds`` of audio instead of the full
+    clip. Closing the generator or setting ``cancel_event`` stops generation
+    early.
+    """
+    if not params.get("model_choice"):
+        raise ValueError("Model choice is required")
+
+    model = load_model_if_needed(params["model_choice"])
+    if not model:
+        raise ValueError("Failed to load model")
+
+    sample_rate = int(model.autoencoder.sampling_rate)
+    eos_token_id = getattr(model, "eos_token_id", 1024)
+
+    positions = queue.Queue()
+    stop = threading.Event()
+    done = object()
+    buffer = {}
+
+    def on_frame(frame, step, max_steps):
+        # The frame is a view into the full delayed code buffer being filled in
+        delayed, position = delayed_buffer(frame)
+        buffer.setdefault("delayed", delayed)
+        buffer["steps"] = step
+        # At the token limit the last callback gets an empty frame past the buffer's end
+        if frame.numel():
+            positions.put(position)
+        return not (stop.is_set() or (cancel_event is not None and cancel_event.is_set()))
+
+    seed = resolve_seed(params)["seed"]
+
+    def run():
+        try:
+            # Preparing the inputs drives the model too, so it happens on the scheduler's thread
+            speaker_embedding = get_speaker_embedding(model, params)
+            audio_prefix_codes = encode_prefix_audio(model, params)
+            conditioning = make_conditioning(model, params, speaker_embedding)
+            with span("generate") as timing, row_seeds([seed], DEFAULT_DEVICE):
+                model.generate(
+                    prefix_conditioning=conditioning,
+                    audio_prefix_codes=audio_prefix_codes,
+                    max_new_tokens=MAX_NEW_TOKENS,
+                    cfg_scale=float(params.get("cfg_scale", 2.0)),
+                    batch_size=1,
+                    sampling_params=sampling_params_from(params),
+                    progress_bar=False,
+                    callback=on_frame,
+                    **generate_options(model, DEFAULT_DEVICE),
+                )
+            record_generation(buffer.get("steps", 0), timing.seconds)
+            positions.put(done)
+        except Exception as e:
+            print(f"Error during audio generation: {str(e)}", file=sys.stderr)
+            positions.put(e)
+
+    generation = SCHEDULER.call(run)
+
+    chunk_frames = max(1, int(chunk_seconds * FRAME_RATE))
+    written = 0
+    emitted = 0
+    eos_at = None
+    finished = False
+    try:
+        while not finished:
+            item = positions.get()
+            if item is done:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled("Cancelled")
+                finished = True
+            elif isinstance(item, Exception):
+                raise ValueError(f"Failed to generate audio: {str(item)}")
+            else:
+                written = item + 1
+                if eos_at is None and int(buffer["delayed"][0, 0, item]) == eos_token_id:
+                    eos_at = item - 1
+
+            if "delayed" not in buffer:
+                continue
+            # A time step is complete once its last codebook has been sampled
+            steps = max(0, written - NUM_CODEBOOKS)
+            complete = finished or (eos_at is not None and steps >= eos_at)
+            available = steps if eos_at is None else min(steps, eos_at)
+            # Hold back a little right context until the end of the clip is known
+            ready = available if complete else available - context_frames
+            if ready <= emitted or (ready - emitted < chunk_frames and not complete):
+                continue
+
+            start = max(0, emitted - context_frames)
+            codes = revert_delays(buffer["delayed"], start, available)
+            with span("decode"):
+                wav = model.autoencoder.decode(codes)
+            samples_per_frame = wav.shape[-1] // codes.shape[-1]
+            chunk = wav[..., (emitted - start) * samples_per_frame:(ready - start) * samples_per_frame]
+            emitted = ready
+            yield sample_rate, to_audio_array(chunk)
+            if complete:
+                break
+    finally:
+        stop.set()
+        if not generation.cancel():
+            generation.result()
@@ -0,0 +1,97 @@
+import os
+import re
+import sys
+import hashlib
+import threading
+import torch
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional
+from atomic_files import atomic_write
+
+CACHE_DIR = Path.home() / '.voicepro' / 'cache'
+
+@lru_cache(maxsize=256)
+def _digest(path: str, mtime_ns: int, size: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents, remembered until the file changes."""
+    stat = os.stat(path)
+    return _digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def model_slug(model_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', model_id)
+
+class TensorCache:
+    """Two-tier cache of tensors keyed by model id and content digest.
+
+    The memory tier is a bounded LRU; every entry is also written to
+    ``~/.voicepro/cache/<namespace>/<model>/<digest>.pt`` so it survives
+    restarts.
+    """
+
+    def __init__(self, namespace: str, capacity: int = 32, cache_dir: Path = CACHE_DIR):
+        self.root = cache_dir / namespace
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, model_id: str, digest: str) -> Path:
+        return self.root / model_slug(model_id) / f"{digest}.pt"
+
+    def get(self, model_id: str, digest: str, device=None) -> Optional[torch.Tensor]:
+        key = (model_id, digest)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        path = self.path_for(model_id, digest)
+        if not path.exists():
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            # Mapped rather than read, so worker processes share the pages
+            tensor = torch.load(path, map_location=device or 'cpu', mmap=True)
+        except Exception as e:
+            print(f"Discarding unreadable cache entry {path}: {str(e)}", file=sys.stderr)
+            path.unlink(missing_ok=True)
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+            self._remember(key, tensor)
+        return tensor
+
+    def put(self, model_id: str, digest: str, tensor: torch.Tensor):
+        path = self.path_for(model_id, digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(path, 'wb') as f:
+            torch.save(tensor.detach().cpu(), f)
+        with self.lock:
+            self._remember((model_id, digest), tensor)
+
+    def get_or_compute(self, model_id: str, digest: str, compute: Callable[[], torch.Tensor],
+                       device=None) -> torch.Tensor:
+        tensor = self.get(model_id, digest, device)
+        if tensor is None:
+            tensor = compute()
+            self.put(model_id, digest, tensor)
+        return tensor
+
+    def _remember(self, key, tensor: torch.Tensor):
+        self.entries[key] = tensor
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
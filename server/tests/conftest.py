@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Server modules import each other as siblings and keep their state under ~/.voicepro
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["HOME"] = tempfile.mkdtemp(prefix="voicepro-tests-")
+
+import benchmark  # noqa: E402
+
+# Server modules import Zonos; fall back to the benchmark's stand-in when it isn't installed
+benchmark.install_zonos_shim()
@@ -0,0 +1,15 @@
+import json
+
+from atomic_files import atomic_write, write_json_atomic
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "registry.json"
+    write_json_atomic(path, {"version": 1})
+    try:
+        with atomic_write(path) as f:
+            f.write('{"version": ')
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+    assert json.loads(path.read_text()) == {"version": 1}
+    assert [p.name for p in tmp_path.iterdir()] == ["registry.json"]
@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from history_log import HistoryLog
+
+@dataclass
+class Entry:
+    id: str
+    action: str
+
+def test_append_after_torn_line_survives_reload(tmp_path):
+    path = tmp_path / "history.jsonl"
+    log = HistoryLog(path, Entry)
+    log.append(Entry("1", "save_project"))
+    log.file.close()
+    # A crash mid-append leaves a partial record with no newline
+    with open(path, 'a') as f:
+        f.write('{"id": "2", "act')
+
+    log = HistoryLog(path, Entry)
+    assert [e.id for e in log.page()] == ["1"]
+    log.append(Entry("3", "delete_project"))
+    log.file.close()
+
+    reloaded = HistoryLog(path, Entry)
+    assert [e.id for e in reloaded.page()] == ["3", "1"]
+
+def test_torn_only_line_is_dropped(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text('{"id": "1", "ac')
+    log = HistoryLog(path, Entry)
+    log.append(Entry("2", "save_project"))
+    log.file.close()
+    assert [e.id for e in HistoryLog(path, Entry).page()] == ["2"]
@@ -0,0 +1,25 @@
+import json
+import time
+from project_store import ProjectStore
+
+def test_failing_on_write_keeps_writer_alive(tmp_path):
+    calls = []
+
+    def on_write(path, data):
+        calls.append(data["name"])
+        if data["name"] == "first":
+            raise OSError("database is locked")
+
+    store = ProjectStore(tmp_path, tmp_path / "trash", delay=0.01, max_wait=0.05, on_write=on_write)
+    store.save("first", {"name": "first"})
+    deadline = time.monotonic() + 2
+    while "first" not in calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.save("second", {"name": "second"})
+    while "second" not in calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert store.thread.is_alive()
+    assert calls == ["first", "second"]
+    assert json.loads(store.path("second").read_text()) == {"name": "second"}
+    assert not store.pending
@@ -0,0 +1,35 @@
+import wave
+import numpy as np
+import render_jobs
+from render_jobs import write_audio
+
+def test_dotted_project_ids_render_to_separate_files(tmp_path):
+    audio = np.zeros(800, dtype=np.float32)
+    first = write_audio(tmp_path / "chapter.1", audio, 8000, {"format": "wav"})
+    second = write_audio(tmp_path / "chapter.2", audio[:400], 8000, {"format": "wav"})
+    assert first.name == "chapter.1.wav"
+    assert second.name == "chapter.2.wav"
+    with wave.open(str(first)) as reader:
+        assert reader.getnframes() == 800
+    with wave.open(str(second)) as reader:
+        assert reader.getnframes() == 400
+
+def test_high_qualities_write_24_bit_wav(tmp_path):
+    audio = np.zeros(800, dtype=np.float32)
+    for quality, width in [("medium", 2), ("high", 3), ("very-high", 3)]:
+        path = write_audio(tmp_path / quality, audio, 8000, {"format": "wav", "quality": quality})
+        with wave.open(str(path)) as reader:
+            assert reader.getsampwidth() == width
+
+def test_compressed_formats_use_the_quality_bit_rate(tmp_path, monkeypatch):
+    saved = {}
+
+    def save(uri, src, sample_rate, format=None, compression=None):
+        saved.update(format=format, compression=compression)
+        open(uri, 'wb').close()
+
+    monkeypatch.setattr(render_jobs.torchaudio, "save", save)
+    path = write_audio(tmp_path / "book", np.zeros(800, dtype=np.float32), 8000,
+                       {"format": "mp3", "quality": "very-high"})
+    assert path.name == "book.mp3"
+    assert saved == {"format": "mp3", "compression": 320_000}
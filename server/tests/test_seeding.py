@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import benchmark
+
+@pytest.fixture(scope="module")
+def synthesis():
+    _, synthesis, _ = benchmark.load_server()
+    return synthesis
+
+def request(text: str, seed: int) -> dict:
+    return {"model_choice": benchmark.STANDIN_MODEL, "text": text, "seed": seed, "randomize_seed": False}
+
+def test_seeded_output_is_reproducible(synthesis):
+    first = synthesis.generate_batch([request("Hello there.", 3)])[0]
+    second = synthesis.generate_batch([request("Hello there.", 3)])[0]
+    assert np.array_equal(first[1], second[1])
+
+def test_batched_rows_match_solo_runs(synthesis):
+    assert synthesis.PER_ROW_SEEDS
+    short = request("Hi.", 11)
+    long = request("This line is a good deal longer than the other one in the batch.", 12)
+    same_length = request("Ho.", 13)
+    batched = synthesis.generate_batch([short, long, same_length])
+    for params, result in zip([short, long, same_length], batched):
+        solo = synthesis.generate_batch([params])[0]
+        assert result[0] == solo[0]
+        assert np.array_equal(result[1], solo[1])
+
+def test_rows_that_reach_the_frame_cap_match_solo_runs(synthesis, monkeypatch):
+    # The last frames of a capped generation fill only the higher codebooks
+    monkeypatch.setattr(synthesis, "MAX_NEW_TOKENS", 40)
+    first = request(benchmark.CORPUS["long"], 21)
+    second = request(benchmark.CORPUS["long"], 22)
+    batched = synthesis.generate_batch([first, second])
+    for params, result in zip([first, second], batched):
+        solo = synthesis.generate_batch([params])[0]
+        assert np.array_equal(result[1], solo[1])
+
+def test_variant_takes_match_their_seeds(synthesis):
+    takes = synthesis.generate_variants(request("Take it again.", 40), count=3)
+    assert [take["seed"] for take, _ in takes] == [40, 41, 42]
+    for take, result in takes:
+        solo = synthesis.generate_batch([take])[0]
+        assert np.array_equal(result[1], solo[1])
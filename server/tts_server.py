@@ -1,23 +1,43 @@
+import os
 import sys
 import json
-import torch
-import torchaudio
-import os
 import time
-import numpy as np
+import atexit
+import signal
+import hashlib
+import importlib
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
-from zonos.model import Zonos, DEFAULT_BACKBONE_CLS as ZonosBackbone
-from zonos.conditioning import make_cond_dict, supported_language_codes
-
-# Global variables
-CURRENT_MODEL_TYPE = None
-CURRENT_MODEL = None
-SPEAKER_EMBEDDING = None
-SPEAKER_AUDIO_PATH = None
-DEFAULT_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-SAMPLES_PATH = os.environ.get('SAMPLES_PATH', '')
+from dispatcher import CommandDispatcher
+from history_log import HistoryLog
+from project_index import ProjectIndex
+from atomic_files import write_json_atomic
+from project_store import ProjectStore
+from metrics import METRICS, span
+
+STARTED = time.monotonic()
+
+DEFAULT_MODEL = os.environ.get('VOICEPRO_DEFAULT_MODEL', 'Zyphra/Zonos-v0.1-transformer')
+
+# Serializes writes to stdout so streamed messages never interleave
+STDOUT_LOCK = threading.Lock()
+
+# Commands served by the inference tier; they run on request threads so that waiting for
+# torch and Zonos to import never holds up project and settings commands on the control thread
+INFERENCE_COMMANDS = {
+    "generate-audio", "generate-long-audio", "get_conditioners", "register_prefix", "list_prefixes",
+    "get_models", "get_voice_settings", "get_model_status", "render_projects", "get_render_jobs",
+    "cancel_render", "generate_variants",
+}
+
+CONTROL_COMMANDS = {
+    "get_settings", "update_settings", "get_projects", "save_project", "get_project", "get_history",
+    "delete_project", "create_from_template", "clear_history", "undo_action", "get_metrics",
+    "get_capabilities", "cancel",
+}
 
 @dataclass
 class ProjectSettings:
@@ -37,6 +57,9 @@ class AppSettings:
     defaultOutputFormat: str
     projectsDirectory: str
     autoSave: bool
+    defaultModel: str = DEFAULT_MODEL
+    cacheResults: bool = False
+    historyRetention: int = 1000
 
 @dataclass
 class HistoryEntry:
@@ -53,7 +76,7 @@ class ProjectManager:
         self.app_dir = Path.home() / '.voicepro'
         self.projects_dir = self.app_dir / 'projects'
         self.settings_file = self.app_dir / 'settings.json'
-        self.history_file = self.app_dir / 'history.json'
+        self.history_file = self.app_dir / 'history.jsonl'
         
         # Create directories if they don't exist
         self.app_dir.mkdir(exist_ok=True)
@@ -61,7 +84,23 @@ class ProjectManager:
         
         # Load or create settings
         self.settings = self._load_settings()
-        self.history: List[HistoryEntry] = self._load_history()
+        self.history = HistoryLog(
+            self.history_file,
+            HistoryEntry,
+            retention=self.settings.historyRetention,
+            legacy_path=self.app_dir / 'history.json'
+        )
+        self.index = ProjectIndex(self.app_dir / 'projects.db', self.projects_dir)
+        # Content digest of each project's last saved body, ignoring its modified time
+        self.digests: Dict[str, str] = {}
+        # Autosaves within VOICEPRO_AUTOSAVE_DELAY_MS of each other are written once
+        self.store = ProjectStore(
+            self.projects_dir,
+            self.app_dir / 'trash',
+            delay=float(os.environ.get('VOICEPRO_AUTOSAVE_DELAY_MS', 500)) / 1000,
+            max_wait=float(os.environ.get('VOICEPRO_AUTOSAVE_MAX_WAIT_MS', 5000)) / 1000,
+            on_write=self._project_written
+        )
         
     def _load_settings(self) -> AppSettings:
         if self.settings_file.exists():
@@ -77,69 +116,62 @@ class ProjectManager:
         )
     
     def _save_settings(self):
-        with open(self.settings_file, 'w') as f:
-            json.dump(asdict(self.settings), f)
-    
-    def _load_history(self) -> List[HistoryEntry]:
-        if self.history_file.exists():
-            with open(self.history_file) as f:
-                data = json.load(f)
-                return [HistoryEntry(**entry) for entry in data]
-        return []
-    
-    def _save_history(self):
-        with open(self.history_file, 'w') as f:
-            json.dump([asdict(entry) for entry in self.history], f)
+        write_json_atomic(self.settings_file, asdict(self.settings))
     
     def add_history_entry(self, entry: HistoryEntry):
-        self.history.insert(0, entry)
-        self._save_history()
+        self.history.append(entry)
+
+    def get_history(self, offset: int = 0, limit: Optional[int] = None) -> List[HistoryEntry]:
+        return self.history.page(offset, limit)
     
     def get_project(self, project_id: str) -> Optional[ProjectSettings]:
-        project_file = self.projects_dir / f"{project_id}.json"
-        if project_file.exists():
-            with open(project_file) as f:
-                data = json.load(f)
-                return ProjectSettings(**data)
-        return None
+        data = self.store.load(project_id)
+        return ProjectSettings(**data) if data is not None else None
     
     def save_project(self, project: ProjectSettings):
         project.modified = time.time()
-        with open(self.projects_dir / f"{project.name}.json", 'w') as f:
-            json.dump(asdict(project), f)
-        
+        data = asdict(project)
+        # Autosave resends unchanged projects; skip those without touching the disk
+        digest = hashlib.sha1(json.dumps({**data, "modified": None}, sort_keys=True).encode()).hexdigest()
+        if self.digests.get(project.name) == digest:
+            return
+        self.digests[project.name] = digest
+        self.store.save(project.name, data)
+
+    def _project_written(self, project_file: Path, data: dict):
+        # Runs on the store's writer thread, once per coalesced write
+        self.index.put(project_file, data)
         self.add_history_entry(HistoryEntry(
             id=str(time.time()),
             action="save_project",
             timestamp=time.time(),
-            details=f"Saved project '{project.name}'",
-            projectId=project.name,
+            details=f"Saved project '{data['name']}'",
+            projectId=data["name"],
             reversible=False
         ))
     
-    def list_projects(self) -> List[ProjectSettings]:
-        projects = []
-        for project_file in self.projects_dir.glob('*.json'):
-            with open(project_file) as f:
-                data = json.load(f)
-                projects.append(ProjectSettings(**data))
-        return sorted(projects, key=lambda p: p.modified, reverse=True)
+    def list_projects(self, offset: int = 0, limit: Optional[int] = None,
+                      search: Optional[str] = None) -> List[dict]:
+        # The index only learns of a project once it is written
+        self.store.flush()
+        return self.index.query(offset, limit, search)
 
     def delete_project(self, project_id: str):
-        project_file = self.projects_dir / f"{project_id}.json"
-        if project_file.exists():
-            project_file.unlink()
-            self.add_history_entry(HistoryEntry(
-                id=str(time.time()),
-                action="delete_project",
-                timestamp=time.time(),
-                details=f"Deleted project '{project_id}'",
-                projectId=project_id,
-                reversible=True,
-                data={"project_id": project_id}
-            ))
-            return True
-        return False
+        self.digests.pop(project_id, None)
+        trash_name = self.store.delete(project_id)
+        if trash_name is None:
+            return False
+        self.index.remove(project_id)
+        self.add_history_entry(HistoryEntry(
+            id=str(time.time()),
+            action="delete_project",
+            timestamp=time.time(),
+            details=f"Deleted project '{project_id}'",
+            projectId=project_id,
+            reversible=True,
+            data={"project_id": project_id, "trash": trash_name}
+        ))
+        return True
 
     def create_from_template(self, template_name: str, new_name: str) -> ProjectSettings:
         template = self.get_project(template_name)
@@ -158,177 +190,111 @@ class ProjectManager:
             return new_project
         raise ValueError(f"Template {template_name} not found")
 
+    def render_params(self, project_id: str):
+        """Generation parameters and output settings for rendering a saved project."""
+        project = self.get_project(project_id)
+        if project is None:
+            raise ValueError(f"Project {project_id} not found")
+        emotions = {**project.voiceSettings.get("emotions", {}), **project.emotionSettings}
+        params = {
+            # Projects store either a model id or a voice name in `voice`
+            "model_choice": project.voice if "/" in project.voice else self.settings.defaultModel,
+            "text": project.text,
+            "speaking_rate": 15.0 * float(project.voiceSettings.get("speed", 1.0)),
+            "linear": emotions.get("linear", 0.5),
+            "confidence": emotions.get("confidence", 0.4),
+            "quadratic": emotions.get("quadratic", 0.0),
+            "seed": emotions.get("seed", 420),
+            "randomize_seed": emotions.get("randomizeSeed", False),
+        }
+        params.update({k: v for k, v in emotions.items() if k in ("e1", "e2", "e3", "e4", "e5", "e6", "e7", "e8")})
+        return params, project.outputSettings
+
     def clear_history(self):
-        self.history = []
-        self._save_history()
+        self.history.clear()
 
     def undo_action(self, action_id: str) -> bool:
-        for i, entry in enumerate(self.history):
-            if entry.id == action_id and entry.reversible:
-                if entry.action == "delete_project":
-                    # Restore the deleted project if possible
-                    backup_file = self.projects_dir / f"{entry.data['project_id']}.backup.json"
-                    if backup_file.exists():
-                        backup_file.rename(self.projects_dir / f"{entry.data['project_id']}.json")
-                        self.history.pop(i)
-                        self._save_history()
-                        return True
-                # Add other reversible actions here
+        entry = self.history.find(action_id)
+        if entry and entry.reversible:
+            if entry.action == "delete_project" and entry.data.get("trash"):
+                # Restore the trashed copy unless a project of that name was created since
+                project_id = entry.data["project_id"]
+                data = self.store.restore(entry.data["trash"], project_id)
+                if data is not None:
+                    self.index.put(self.store.path(project_id), data)
+                    self.history.remove(action_id)
+                    return True
+            # Add other reversible actions here
         return False
 
-def load_model_if_needed(model_choice: str):
-    try:
-        global CURRENT_MODEL_TYPE, CURRENT_MODEL
-        if CURRENT_MODEL_TYPE != model_choice:
-            if CURRENT_MODEL is not None:
-                del CURRENT_MODEL
-                torch.cuda.empty_cache()
-            print(f"Loading {model_choice} model...", file=sys.stderr)
-            CURRENT_MODEL = Zonos.from_pretrained(model_choice, device=DEFAULT_DEVICE)
-            CURRENT_MODEL.requires_grad_(False).eval()
-            CURRENT_MODEL_TYPE = model_choice
-            print(f"{model_choice} model loaded successfully!", file=sys.stderr)
-        return CURRENT_MODEL
-    except Exception as e:
-        print(f"Error loading model: {str(e)}", file=sys.stderr)
-        raise ValueError(f"Failed to load model {model_choice}: {str(e)}")
-
-def handle_command(command: dict):
+def emit(message: dict, payload: Optional[bytes] = None):
+    with span("emit"), STDOUT_LOCK:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+        if payload is not None:
+            sys.stdout.buffer.write(payload)
+            sys.stdout.buffer.flush()
+
+class InferenceTier:
+    """Imports torch, Zonos and the synthesis stack on a background thread.
+
+    The server answers project and settings commands while this runs;
+    inference commands wait on ``module()``. ``on_ready`` is called with the
+    imported module, or with None if the import failed.
+    """
+
+    def __init__(self, module_name: str, on_ready=None):
+        self.module_name = module_name
+        self.on_ready = on_ready
+        self.future = Future()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._load, name='import-inference', daemon=True)
+                self.thread.start()
+
+    def module(self):
+        self.start()
+        return self.future.result()
+
+    def state(self) -> str:
+        if not self.future.done():
+            return "loading" if self.thread is not None else "idle"
+        return "error" if self.future.exception() is not None else "ready"
+
+    def _load(self):
+        try:
+            module = importlib.import_module(self.module_name)
+            module.start(project_manager, emit)
+        except Exception as e:
+            print(f"Error loading inference modules: {str(e)}", file=sys.stderr)
+            self.future.set_exception(RuntimeError(f"Inference is unavailable: {str(e)}"))
+            module = None
+        else:
+            self.future.set_result(module)
+        if self.on_ready is not None:
+            self.on_ready(module)
+        if module is not None:
+            module.resume()
+
+def announce(tier: str, **data):
+    """Tell the client a tier of commands can now be served."""
+    emit({"event": "ready", "data": {"tier": tier, "seconds": round(time.monotonic() - STARTED, 3), **data}})
+
+def inference_ready(module):
+    if module is None:
+        announce("inference", error=str(INFERENCE.future.exception()))
+    else:
+        announce("inference", capabilities=sorted(INFERENCE_COMMANDS), **module.describe())
+
+INFERENCE = InferenceTier('inference_commands', inference_ready)
+
+def handle_command(command: dict, cancel_event: Optional[threading.Event] = None):
     try:
-        if command["type"] == "get_models":
-            supported_models = []
-            if 'transformer' in ZonosBackbone.supported_architectures:
-                supported_models.append('Zyphra/Zonos-v0.1-transformer')
-            if 'hybrid' in ZonosBackbone.supported_architectures:
-                supported_models.append('Zyphra/Zonos-v0.1-hybrid')
-            return {"success": True, "data": supported_models}
-
-        elif command["type"] == "get_conditioners":
-            if not command.get("model"):
-                raise ValueError("Model choice is required")
-            model = load_model_if_needed(command["model"])
-            if not model:
-                raise ValueError("Failed to load model")
-            conditioners = [c.name for c in model.prefix_conditioner.conditioners]
-            return {"success": True, "data": conditioners}
-
-        elif command["type"] == "generate-audio":
-            if not command.get("params"):
-                raise ValueError("Parameters are required")
-            
-            params = command["params"]
-            if not params.get("model_choice"):
-                raise ValueError("Model choice is required")
-            
-            # Load and verify model
-            model = load_model_if_needed(params["model_choice"])
-            if not model:
-                raise ValueError("Failed to load model")
-
-            # Handle speaker embedding
-            global SPEAKER_EMBEDDING, SPEAKER_AUDIO_PATH
-            if params.get("speaker_audio") and "speaker" not in params.get("unconditional_keys", []):
-                if params["speaker_audio"] != SPEAKER_AUDIO_PATH:
-                    try:
-                        audio_path = params["speaker_audio"]
-                        if audio_path.startswith('/samples/'):
-                            audio_path = os.path.join(SAMPLES_PATH, os.path.basename(audio_path))
-                        print("Computing speaker embedding", file=sys.stderr)
-                        wav, sr = torchaudio.load(audio_path)
-                        SPEAKER_EMBEDDING = model.make_speaker_embedding(wav, sr)
-                        SPEAKER_EMBEDDING = SPEAKER_EMBEDDING.to(DEFAULT_DEVICE, torch.bfloat16)
-                        SPEAKER_AUDIO_PATH = params["speaker_audio"]
-                    except Exception as e:
-                        print(f"Error processing reference audio: {str(e)}", file=sys.stderr)
-                        raise ValueError(f"Failed to process reference audio: {str(e)}")
-
-            # Handle prefix audio
-            audio_prefix_codes = None
-            if params.get("prefix_audio"):
-                try:
-                    wav_prefix, sr_prefix = torchaudio.load(params["prefix_audio"])
-                    wav_prefix = wav_prefix.mean(0, keepdim=True)
-                    wav_prefix = model.autoencoder.preprocess(wav_prefix, sr_prefix)
-                    wav_prefix = wav_prefix.to(DEFAULT_DEVICE, torch.float32)
-                    audio_prefix_codes = model.autoencoder.encode(wav_prefix.unsqueeze(0))
-                except Exception as e:
-                    print(f"Error processing prefix audio: {str(e)}", file=sys.stderr)
-                    raise ValueError(f"Failed to process prefix audio: {str(e)}")
-
-            try:
-                # Create emotion tensor
-                emotion_tensor = torch.tensor([
-                    float(params.get("e1", 1.0)),  # Happiness
-                    float(params.get("e2", 0.05)),  # Sadness
-                    float(params.get("e3", 0.05)),  # Disgust
-                    float(params.get("e4", 0.05)),  # Fear
-                    float(params.get("e5", 0.05)),  # Surprise
-                    float(params.get("e6", 0.05)),  # Anger
-                    float(params.get("e7", 0.1)),   # Other
-                    float(params.get("e8", 0.2)),   # Neutral
-                ], device=DEFAULT_DEVICE)
-
-                # Create VQ score tensor
-                vq_val = float(params.get("vq_single", 0.78))
-                vq_tensor = torch.tensor([vq_val] * 8, device=DEFAULT_DEVICE).unsqueeze(0)
-
-                # Create conditioning dictionary
-                cond_dict = make_cond_dict(
-                    text=params.get("text", ""),
-                    language=params.get("language", "en-us"),
-                    speaker=SPEAKER_EMBEDDING,
-                    emotion=emotion_tensor,
-                    vqscore_8=vq_tensor,
-                    fmax=float(params.get("fmax", 24000)),
-                    pitch_std=float(params.get("pitch_std", 45.0)),
-                    speaking_rate=float(params.get("speaking_rate", 15.0)),
-                    dnsmos_ovrl=float(params.get("dnsmos_ovrl", 4.0)),
-                    speaker_noised=bool(params.get("speaker_noised", False)),
-                    device=DEFAULT_DEVICE,
-                    unconditional_keys=params.get("unconditional_keys", ["emotion"]),
-                )
-
-                conditioning = model.prepare_conditioning(cond_dict)
-
-                # Generate audio
-                codes = model.generate(
-                    prefix_conditioning=conditioning,
-                    audio_prefix_codes=audio_prefix_codes,
-                    max_new_tokens=86 * 30,
-                    cfg_scale=float(params.get("cfg_scale", 2.0)),
-                    batch_size=1,
-                    sampling_params={
-                        "top_p": float(params.get("top_p", 0.8)),
-                        "top_k": int(params.get("top_k", 50)),
-                        "min_p": float(params.get("min_p", 0.05)),
-                        "linear": float(params.get("linear", 0.5)),
-                        "conf": float(params.get("confidence", 0.4)),
-                        "quad": float(params.get("quadratic", 0.0))
-                    },
-                )
-
-                # Decode to waveform
-                wav_out = model.autoencoder.decode(codes)
-                wav_out = wav_out.squeeze().cpu().detach()
-
-                # Convert to float32 numpy array and validate
-                audio_data = wav_out.numpy().astype('float32')
-                if not np.all(np.isfinite(audio_data)):
-                    raise ValueError("Generated audio contains invalid values")
-
-                return {
-                    "success": True,
-                    "data": [
-                        int(model.autoencoder.sampling_rate),
-                        audio_data.tolist()
-                    ]
-                }
-
-            except Exception as e:
-                print(f"Error during audio generation: {str(e)}", file=sys.stderr)
-                raise ValueError(f"Failed to generate audio: {str(e)}")
-
-        elif command["type"] == "get_settings":
+        if command["type"] == "get_settings":
             return {"success": True, "data": asdict(project_manager.settings)}
             
         elif command["type"] == "update_settings":
@@ -337,8 +303,13 @@ def handle_command(command: dict):
             return {"success": True, "data": None}
             
         elif command["type"] == "get_projects":
-            projects = project_manager.list_projects()
-            return {"success": True, "data": [asdict(p) for p in projects]}
+            limit = command.get("limit")
+            projects = project_manager.list_projects(
+                int(command.get("offset", 0)),
+                None if limit is None else int(limit),
+                command.get("search")
+            )
+            return {"success": True, "data": projects}
             
         elif command["type"] == "save_project":
             project = ProjectSettings(**command["project"])
@@ -350,7 +321,10 @@ def handle_command(command: dict):
             return {"success": True, "data": asdict(project) if project else None}
             
         elif command["type"] == "get_history":
-            return {"success": True, "data": [asdict(h) for h in project_manager.history]}
+            offset = int(command.get("offset", 0))
+            limit = command.get("limit")
+            history = project_manager.get_history(offset, None if limit is None else int(limit))
+            return {"success": True, "data": [asdict(h) for h in history]}
 
         elif command["type"] == "delete_project":
             success = project_manager.delete_project(command["projectId"])
@@ -371,51 +345,59 @@ def handle_command(command: dict):
             success = project_manager.undo_action(command["actionId"])
             return {"success": True, "data": success}
 
-        elif command["type"] == "get_voice_settings":
-            model = load_model_if_needed(command["voice"])
-            settings = {
-                "supported_languages": supported_language_codes,
-                "parameters": {
-                    "speed": {"min": 0.5, "max": 2.0, "default": 1.0},
-                    "pitch": {"min": 0.5, "max": 2.0, "default": 1.0},
-                    "tone": {"min": 0.0, "max": 1.0, "default": 0.5},
-                    "emotions": {
-                        "linear": {"min": 0.0, "max": 1.0, "default": 0.5},
-                        "confidence": {"min": 0.0, "max": 1.0, "default": 0.5},
-                        "quadratic": {"min": 0.0, "max": 1.0, "default": 0.0},
-                    },
-                    "seed": {"min": 0, "max": 1000000, "default": 0},
-                    "randomize_seed": {"default": True},
-                    "unconditional_k": {"default": ["emotion"]},
-                }
-            }
-            return {"success": True, "data": settings}
+        elif command["type"] == "get_metrics":
+            return {"success": True, "data": METRICS.render()}
+
+        elif command["type"] == "get_capabilities":
+            return {"success": True, "data": {"control": "ready", "inference": INFERENCE.state()}}
+
+        elif command["type"] in INFERENCE_COMMANDS:
+            return INFERENCE.module().handle_command(command, cancel_event)
+
+        else:
+            raise ValueError(f"Unknown command type: {command['type']}")
 
     except Exception as e:
         error_msg = str(e)
         print(f"Error in handle_command: {error_msg}", file=sys.stderr)
         return {"success": False, "error": error_msg}
 
+def init() -> "ProjectManager":
+    global project_manager
+    if project_manager is None:
+        project_manager = ProjectManager()
+    return project_manager
+
+def terminate(signum, frame):
+    project_manager.store.close()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
 def main():
+    dispatcher = CommandDispatcher(handle_command, emit, INFERENCE_COMMANDS)
+    init()
+    # Write autosaves still waiting out their delay, whether stdin closes or we are terminated
+    atexit.register(project_manager.store.close)
+    signal.signal(signal.SIGTERM, terminate)
+    announce("control", capabilities=sorted(CONTROL_COMMANDS))
+    # Project and settings commands are served while torch and Zonos import
+    INFERENCE.start()
     while True:
         try:
             line = sys.stdin.readline()
             if not line:
                 break
                 
-            command = json.loads(line)
-            result = handle_command(command)
-            
-            # Write response
-            sys.stdout.write(json.dumps(result) + "\n")
-            sys.stdout.flush()
+            # Responses carry the command's id and may arrive out of order
+            dispatcher.submit(json.loads(line))
             
         except Exception as e:
             sys.stderr.write(f"Error: {str(e)}\n")
             sys.stderr.flush()
+    dispatcher.shutdown()
 
-# Initialize project manager
-project_manager = ProjectManager()
+# Created by init(), so importing this module stays cheap
+project_manager: Optional[ProjectManager] = None
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+import os
+import sys
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from typing import List, Optional
+
+# synthesis functions a worker will run, each called as fn(params, cancel_event=..., **options)
+TASKS = ("generate_audio", "generate_variants")
+
+def core_groups(workers: int) -> List[List[int]]:
+    """Split the cores this process may use into ``workers`` contiguous groups."""
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers, len(cores)))
+    size, extra = divmod(len(cores), workers)
+    groups = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+def worker_main(conn, cores: List[int], default_model: Optional[str]):
+    """Entry point of an inference worker process.
+
+    Pins itself to ``cores`` before torch is imported, so its thread pool is
+    sized to them, then serves ``("generate", id, task, params, options)``
+    messages one at a time. A listener thread takes ``("cancel", id)`` messages while a
+    generation runs.
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    os.environ['VOICEPRO_CPU_THREADS'] = str(len(cores))
+    import synthesis
+
+    if default_model:
+        synthesis.MODEL_MANAGER.preload(default_model)
+
+    jobs = queue.Queue()
+    cancel_events = {}
+    lock = threading.Lock()
+
+    def listen():
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == "generate":
+                    with lock:
+                        cancel_events[message[1]] = threading.Event()
+                    jobs.put(message)
+                elif message[0] == "cancel":
+                    with lock:
+                        cancel_event = cancel_events.get(message[1])
+                    if cancel_event is not None:
+                        cancel_event.set()
+        except (EOFError, OSError):
+            jobs.put(None)
+
+    threading.Thread(target=listen, name='worker-listener', daemon=True).start()
+    conn.send(("ready", os.getpid()))
+    while True:
+        message = jobs.get()
+        if message is None:
+            break
+        _, job_id, task, params, options = message
+        with lock:
+            cancel_event = cancel_events[job_id]
+        try:
+            if task not in TASKS:
+                raise ValueError(f"Unknown worker task {task}")
+            run = getattr(synthesis, task)
+            result = ("done", job_id, run(params, cancel_event=cancel_event, **options))
+        except synthesis.GenerationCancelled:
+            result = ("cancelled", job_id, None)
+        except Exception as e:
+            result = ("failed", job_id, str(e))
+        with lock:
+            cancel_events.pop(job_id, None)
+        conn.send(result)
+
+class _Worker:
+    def __init__(self, context, cores: List[int], default_model: Optional[str]):
+        self.cores = cores
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child, cores, default_model),
+                                       name=f"inference-worker-{cores[0]}", daemon=True)
+        self.process.start()
+        child.close()
+
+class WorkerPool:
+    """Runs generate-audio requests across inference worker processes.
+
+    Each worker is pinned to its own group of cores and holds its own model,
+    memory-mapped from the shared weights snapshot (see
+    ``cpu_inference.load_shared``), so a single-clip generation, which
+    PyTorch parallelizes poorly, no longer leaves most cores idle. Requests
+    wait in one queue and go to whichever worker frees up first; a worker
+    that dies is replaced and its request fails.
+    """
+
+    def __init__(self, workers: int, default_model: Optional[str] = None,
+                 on_cancel=lambda: RuntimeError("Cancelled")):
+        # Forked children would inherit this process's threads and torch state
+        self.context = multiprocessing.get_context('spawn')
+        self.default_model = default_model
+        self.on_cancel = on_cancel
+        self.jobs = queue.Queue()
+        self.next_id = 0
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.groups = core_groups(workers)
+        for index, cores in enumerate(self.groups):
+            threading.Thread(target=self._feed, args=(cores,), name=f'pool-feeder-{index}', daemon=True).start()
+
+    def size(self) -> int:
+        return len(self.groups)
+
+    def submit(self, params: dict, cancel_event: Optional[threading.Event] = None,
+               task: str = "generate_audio", **options) -> Future:
+        future = Future()
+        with self.lock:
+            self.next_id += 1
+            job_id = self.next_id
+        self.jobs.put((job_id, (task, params, options), cancel_event, future))
+        return future
+
+    def generate(self, params: dict, cancel_event: Optional[threading.Event] = None):
+        return self.submit(params, cancel_event).result()
+
+    def generate_variants(self, params: dict, variants: list, cancel_event: Optional[threading.Event] = None):
+        return self.submit(params, cancel_event, task="generate_variants", variants=variants).result()
+
+    def _start(self, cores: List[int]) -> Optional[_Worker]:
+        try:
+            worker = _Worker(self.context, cores, self.default_model)
+            worker.conn.recv()
+            print(f"Inference worker {worker.process.pid} started on cores {cores}", file=sys.stderr)
+            return worker
+        except Exception as e:
+            print(f"Error starting inference worker on cores {cores}: {str(e)}", file=sys.stderr)
+            return None
+
+    def _feed(self, cores: List[int]):
+        worker = self._start(cores)
+        while True:
+            job_id, (task, params, options), cancel_event, future = self.jobs.get()
+            if cancel_event is not None and cancel_event.is_set():
+                future.set_exception(self.on_cancel())
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            if worker is None or not worker.process.is_alive():
+                worker = self._start(cores)
+                if worker is None:
+                    future.set_exception(RuntimeError("Inference worker failed to start"))
+                    continue
+            with self.lock:
+                self.busy += 1
+            try:
+                worker.conn.send(("generate", job_id, task, params, options))
+                sent_cancel = False
+                # Poll so a cancel can be forwarded while the worker generates
+                while not worker.conn.poll(0.1):
+                    if not worker.process.is_alive():
+                        raise EOFError("worker exited")
+                    if cancel_event is not None and cancel_event.is_set() and not sent_cancel:
+                        worker.conn.send(("cancel", job_id))
+                        sent_cancel = True
+                status, _, result = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                print(f"Inference worker on cores {cores} died: {str(e)}", file=sys.stderr)
+                future.set_exception(RuntimeError("Inference worker exited during generation"))
+                worker = None
+                continue
+            finally:
+                with self.lock:
+                    self.busy -= 1
+            if status == "done":
+                future.set_result(result)
+            elif status == "cancelled":
+                future.set_exception(self.on_cancel())
+            else:
+                future.set_exception(ValueError(result))